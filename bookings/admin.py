@@ -1,6 +1,7 @@
 from django.contrib import admin
-from bookings.models import VaccineRecord, CampaignReview, Payment
+from bookings.models import VaccineRecord, CampaignReview, Payment, WaitlistEntry
 
 admin.site.register(VaccineRecord)
 admin.site.register(CampaignReview)
 admin.site.register(Payment)
+admin.site.register(WaitlistEntry)
@@ -0,0 +1,159 @@
+"""
+Second-dose allocation for new vaccine records.
+
+A record's second dose goes into the schedule window of its campaign on
+``first dose date + dosage_interval_days`` with the same start and end time.
+Missing windows are created with ``bulk_create(ignore_conflicts=True)``, so
+the unique (campaign, date, start_time, end_time) constraint makes
+concurrent bookings share one window instead of creating duplicates. The
+slots are then taken with the same conditional UPDATE as first doses, one
+statement per window, so a window can never be oversold.
+
+Call ``allocate_second_doses`` inside the transaction that creates the
+records: if the records are rolled back, so are the claimed slots. A
+single booking instead resolves its window with ``plan_second_doses``
+before claiming anything, and claims it with ``claim_second_doses`` next to
+its first-dose claim, so the claimed schedule rows stay locked only for the
+INSERT and the commit.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, Q
+from campaigns import availability
+from campaigns.inventory import claim_slot
+from campaigns.models import VaccineSchedule
+from .models import Payment, VaccineRecord
+
+
+class SecondDoseUnavailable(Exception):
+    pass
+
+
+def second_dose_window(record):
+    first = record.first_dose_schedule
+    return (
+        record.campaign_id,
+        first.date + timedelta(days=record.campaign.dosage_interval_days),
+        first.start_time,
+        first.end_time,
+    )
+
+
+def _window_query(windows):
+    query = Q()
+    for campaign_id, date, start_time, end_time in windows:
+        query |= Q(campaign_id=campaign_id, date=date, start_time=start_time, end_time=end_time)
+    return query
+
+
+def _fetch_windows(windows):
+    return {
+        (s.campaign_id, s.date, s.start_time, s.end_time): s
+        for s in VaccineSchedule.objects.filter(_window_query(windows))
+    }
+
+
+def _create_windows(windows, groups, first_doses_claimed):
+    """
+    Create missing second-dose windows. Each is sized to the full capacity of
+    the first-dose window that feeds it (its free slots, the slots held for
+    pending premium payments and every booking already made on it, including
+    this batch once its first-dose slots are claimed), so first-dose bookings
+    are never refused for lack of a second-dose slot.
+    """
+    first_ids = {groups[window][0].first_dose_schedule_id for window in windows}
+    free = dict(VaccineSchedule.objects.filter(pk__in=first_ids).values_list('pk', 'available_slots'))
+    booked = dict(
+        VaccineRecord.objects.filter(first_dose_schedule_id__in=first_ids)
+        .values('first_dose_schedule').annotate(n=Count('id'))
+        .values_list('first_dose_schedule', 'n')
+    )
+    held = dict(
+        Payment.objects.filter(
+            schedule_id__in=first_ids, payment_status=Payment.PENDING, hold_expires_at__isnull=False
+        )
+        .values('schedule_id').annotate(n=Count('id'))
+        .values_list('schedule_id', 'n')
+    )
+    pending = Counter(
+        record.first_dose_schedule_id
+        for window in windows for record in groups[window] if record.pk is None
+    ) if first_doses_claimed else Counter()
+
+    schedules = []
+    for window in windows:
+        first_id = groups[window][0].first_dose_schedule_id
+        campaign_id, date, start_time, end_time = window
+        schedules.append(VaccineSchedule(
+            campaign_id=campaign_id,
+            date=date,
+            start_time=start_time,
+            end_time=end_time,
+            available_slots=free.get(first_id, 0) + held.get(first_id, 0) + booked.get(first_id, 0) + pending[first_id],
+        ))
+    VaccineSchedule.objects.bulk_create(schedules, ignore_conflicts=True)
+
+    for campaign_id in {window[0] for window in windows}:
+        transaction.on_commit(lambda campaign_id=campaign_id: availability.invalidate_campaign(campaign_id))
+
+
+def plan_second_doses(records, first_doses_claimed=True):
+    """
+    Find, or create, the second-dose window of each record that does not
+    have one yet, without claiming any slot. Returns the plan to pass to
+    ``claim_second_doses``: (schedule, records) pairs in lock order.
+    `first_doses_claimed` tells whether the records' first-dose slots are
+    already off their schedules' free counts.
+    """
+    groups = defaultdict(list)
+    for record in records:
+        if record.second_dose_schedule_id is None:
+            groups[second_dose_window(record)].append(record)
+    if not groups:
+        return []
+
+    schedules = _fetch_windows(groups)
+    missing = [window for window in groups if window not in schedules]
+    if missing:
+        _create_windows(missing, groups, first_doses_claimed)
+        schedules.update(_fetch_windows(missing))
+    # Sorted so concurrent batches lock the schedule rows in the same order
+    return [(schedules[window], groups[window]) for window in sorted(groups)]
+
+
+def claim_second_doses(plan, partial=False):
+    """
+    Reserve the slots of a ``plan_second_doses`` plan and assign each record
+    its second-dose schedule, with one UPDATE per window.
+
+    Raises SecondDoseUnavailable if a window is full; nothing is reserved in
+    that case as long as the caller's transaction is rolled back. With
+    `partial`, a full window instead gives its remaining slots to the first
+    of its records, and the records left without a second dose are returned.
+    """
+    unplaced = []
+    for schedule, group in plan:
+        if not claim_slot(schedule.pk, len(group)):
+            if not partial:
+                raise SecondDoseUnavailable(
+                    f"No second-dose slots left on {schedule.date} {schedule.start_time}-{schedule.end_time}."
+                )
+            left = VaccineSchedule.objects.select_for_update().get(pk=schedule.pk).available_slots
+            if not (left and claim_slot(schedule.pk, left)):
+                left = 0
+            group, rest = group[:left], group[left:]
+            unplaced += rest
+        for record in group:
+            record.second_dose_schedule = schedule
+    return unplaced
+
+
+def allocate_second_doses(records, partial=False):
+    """
+    Assign and reserve a second-dose schedule for each record that does not
+    have one yet. Records may be unsaved; the caller saves them afterwards.
+    Uses a constant number of queries plus one UPDATE per distinct window.
+    Raises or returns as ``claim_second_doses``.
+    """
+    return claim_second_doses(plan_second_doses(records), partial)
@@ -0,0 +1,262 @@
+"""
+Batch booking engine shared by the bulk import endpoint, the
+``import_bookings`` command and the booking queue.
+
+A batch is validated with a fixed number of set-based queries regardless of
+its size: one for the patients, one for their existing bookings and one for
+the campaign's bookable schedules. The booking queue worker reuses
+``book_entries`` for its batches. Slots are handed out in memory while the
+schedule rows are locked. Then one UPDATE takes them from every schedule,
+the second doses are allocated for the whole batch and the records are
+written with ``bulk_create``. Entries whose second-dose window is full fail
+on their own and give their first-dose slot back; the rest are booked.
+
+Each input row is a mapping with:
+  - ``patient``: NID or email of a patient (``nid`` / ``email`` also accepted)
+  - ``schedule_id`` (optional): the preferred schedule
+  - ``date`` (optional, YYYY-MM-DD): any schedule on that day
+Without a preference the earliest schedule with a free slot is used.
+"""
+import csv
+import io
+import json
+from collections import Counter
+from datetime import date as dt_date
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+from campaigns import availability
+from campaigns.inventory import release_slots
+from campaigns.models import VaccineCampaign, VaccineSchedule
+from users.models import User
+from .allocation import allocate_second_doses, second_dose_window
+from .models import VaccineRecord
+from . import rollups
+
+BOOKED = 'booked'
+FAILED = 'failed'
+BATCH_SIZE = 1000
+
+
+class BulkBookingError(Exception):
+    pass
+
+
+def parse_rows(stream, format=None, name=''):
+    """Read rows from a CSV or JSONL byte or text stream."""
+    data = stream.read()
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if format is None:
+        format = 'jsonl' if name.endswith(('.jsonl', '.ndjson', '.json')) or data.lstrip().startswith('{') else 'csv'
+    if format == 'csv':
+        return list(csv.DictReader(io.StringIO(data)))
+    if format == 'jsonl':
+        rows = []
+        for number, line in enumerate(data.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                raise BulkBookingError(f"Line {number} is not valid JSON.")
+        return rows
+    raise BulkBookingError(f"Unsupported format: {format}")
+
+
+def _normalize(index, row):
+    if not isinstance(row, dict):
+        return {'row': index, 'patient': '', 'error': "Row must be an object."}
+    identifier = str(row.get('patient') or row.get('nid') or row.get('email') or '').strip()
+    entry = {'row': index, 'patient': identifier, 'schedule_id': None, 'date': None, 'error': None}
+    if not identifier:
+        entry['error'] = "Missing patient NID or email."
+        return entry
+    schedule_id = row.get('schedule_id')
+    if schedule_id not in (None, ''):
+        try:
+            entry['schedule_id'] = int(schedule_id)
+        except (TypeError, ValueError):
+            entry['error'] = "schedule_id must be an integer."
+            return entry
+    day = row.get('date')
+    if day not in (None, ''):
+        try:
+            entry['date'] = dt_date.fromisoformat(str(day))
+        except ValueError:
+            entry['error'] = "date must be YYYY-MM-DD."
+    return entry
+
+
+def _fail(entry, detail):
+    entry['error'] = detail
+    return entry
+
+
+class _SlotPool:
+    """Free slots of a campaign's bookable schedules, handed out in memory."""
+
+    def __init__(self, schedules):
+        self.schedules = schedules
+        self.by_id = {s.pk: s for s in schedules}
+        self.remaining = {s.pk: s.available_slots for s in schedules}
+        self.taken = {}
+
+    def take(self, schedule_id=None, day=None):
+        if schedule_id is not None:
+            candidates = [self.by_id[schedule_id]] if schedule_id in self.by_id else []
+        elif day is not None:
+            candidates = [s for s in self.schedules if s.date == day]
+        else:
+            candidates = self.schedules
+        for schedule in candidates:
+            if self.remaining[schedule.pk] > 0:
+                self.remaining[schedule.pk] -= 1
+                self.taken[schedule.pk] = self.taken.get(schedule.pk, 0) + 1
+                return schedule
+        return None
+
+    def commit(self):
+        """Take every handed-out slot from the database in one UPDATE."""
+        if not self.taken:
+            return
+        VaccineSchedule.objects.filter(pk__in=self.taken).update(
+            available_slots=F('available_slots') - Case(
+                *[When(pk=pk, then=Value(count)) for pk, count in self.taken.items()]
+            ),
+            updated_at=timezone.now()
+        )
+        taken = dict(self.taken)
+        transaction.on_commit(lambda: [availability.adjust_slots(pk, -count) for pk, count in taken.items()])
+
+
+def lock_campaign(campaign_id):
+    """Lock a campaign for a batch and check that it can be batch booked."""
+    campaign = VaccineCampaign.objects.select_for_update().get(pk=campaign_id)
+    if campaign.status not in [VaccineCampaign.ACTIVE, VaccineCampaign.UPCOMING]:
+        raise BulkBookingError("This campaign is not open for booking.")
+    if campaign.is_premium:
+        raise BulkBookingError("Premium campaigns require a payment per patient and cannot be bulk booked.")
+    return campaign
+
+
+def book_entries(campaign, entries):
+    """
+    Book entries into a campaign locked with lock_campaign, in order.
+
+    Each entry needs ``patient_id`` (plus the optional ``schedule_id`` / ``date``
+    preferences) and an ``error`` that is None; entries that cannot be booked
+    get an ``error``, booked ones a ``record``. Must run inside the caller's
+    transaction. Returns the created records.
+    """
+    booked_ids = set(VaccineRecord.objects.filter(
+        campaign=campaign,
+        patient_id__in={e['patient_id'] for e in entries if not e['error']}
+    ).values_list('patient_id', flat=True))
+
+    # Ordered by pk while locking so concurrent batches cannot deadlock
+    locked = list(VaccineSchedule.objects.select_for_update().filter(
+        campaign=campaign,
+        date__gte=timezone.now().date(),
+        available_slots__gt=0
+    ).order_by('pk'))
+    pool = _SlotPool(sorted(locked, key=lambda s: (s.date, s.start_time, s.pk)))
+    places = max(0, campaign.max_participants - campaign.participant_count)
+
+    records = []
+    for entry in entries:
+        if entry['error']:
+            continue
+        if entry['patient_id'] in booked_ids:
+            _fail(entry, "Patient already has a booking for this campaign.")
+        elif len(records) >= places:
+            _fail(entry, "This campaign has reached its participant limit.")
+        else:
+            schedule = pool.take(entry.get('schedule_id'), entry.get('date'))
+            if schedule is None:
+                _fail(entry, "No available slots for the requested schedule.")
+                continue
+            booked_ids.add(entry['patient_id'])
+            entry['record'] = VaccineRecord(
+                patient_id=entry['patient_id'],
+                campaign=campaign,
+                first_dose_schedule=schedule,
+                status=VaccineRecord.SCHEDULED
+            )
+            records.append(entry['record'])
+
+    if records:
+        pool.commit()
+        unplaced = allocate_second_doses(records, partial=True)
+        if unplaced:
+            # Only the entries whose second-dose window is full fail; their first-dose slots go back
+            unplaced_ids = {id(record) for record in unplaced}
+            for entry in entries:
+                if id(entry.get('record')) in unplaced_ids:
+                    _, day, start_time, end_time = second_dose_window(entry.pop('record'))
+                    _fail(entry, f"No second-dose slots left on {day} {start_time}-{end_time}.")
+            release_slots(Counter(record.first_dose_schedule_id for record in unplaced))
+            records = [record for record in records if id(record) not in unplaced_ids]
+    if records:
+        VaccineRecord.objects.bulk_create(records, batch_size=BATCH_SIZE)
+        rollups.bookings_made(records)
+        VaccineCampaign.objects.filter(pk=campaign.pk).update(
+            participant_count=F('participant_count') + len(records),
+            updated_at=timezone.now()
+        )
+    return records
+
+
+def book_in_bulk(campaign_id, rows, dry_run=False):
+    """
+    Book a batch of patients into a campaign.
+
+    Returns a report with one result per input row, in input order. Rows fail
+    individually (unknown patient, already booked, no slot left, ...); the
+    rest are booked in one transaction. With ``dry_run`` nothing is saved.
+    """
+    entries = [_normalize(index, row) for index, row in enumerate(rows, start=1)]
+
+    with transaction.atomic():
+        campaign = lock_campaign(campaign_id)
+
+        identifiers = {e['patient'] for e in entries if not e['error']}
+        patients = {}
+        for nid, email, pk in User.objects.filter(
+            Q(nid__in=identifiers) | Q(email__in=identifiers), role=User.Role.PATIENT
+        ).values_list('nid', 'email', 'pk'):
+            patients[nid] = pk
+            patients[email] = pk
+        for entry in entries:
+            if not entry['error']:
+                entry['patient_id'] = patients.get(entry['patient'])
+                if entry['patient_id'] is None:
+                    _fail(entry, "No patient with this NID or email.")
+
+        records = book_entries(campaign, entries)
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    results = []
+    for entry in entries:
+        result = {'row': entry['row'], 'patient': entry['patient']}
+        if entry['error']:
+            result.update(status=FAILED, detail=entry['error'])
+        else:
+            record = entry['record']
+            result.update(
+                status=BOOKED,
+                schedule_id=record.first_dose_schedule_id,
+                second_dose_schedule_id=record.second_dose_schedule_id,
+                record_id=None if dry_run else record.pk,
+            )
+        results.append(result)
+
+    booked = len(records)
+    return {
+        'dry_run': dry_run,
+        'booked': booked,
+        'failed': len(entries) - booked,
+        'results': results,
+    }
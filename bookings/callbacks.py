@@ -0,0 +1,173 @@
+"""
+Payment gateway callbacks.
+
+``process_callback`` handles the success, fail and cancel callbacks in one
+transaction that starts by locking the payment row. Only a PENDING (or
+EXPIRED, for a late payment) payment is processed; a replayed or
+concurrent callback finds the payment already settled and changes nothing,
+so a payment books at most one VaccineRecord. The gateway's transaction id
+is unique across payments, so it cannot settle two of them either.
+
+Callbacks arrive from the patient's browser, so anyone can post one. The
+views only call ``process_callback`` once the gateway has confirmed the
+payment (``verified_transaction``) or its failure (``verified_unpaid``),
+and the transaction id recorded is the gateway's, not the one posted.
+
+Booking after a successful payment runs in a savepoint: if the slot or the
+second dose is gone, the payment is still recorded as paid and the caller
+gets the reason back.
+"""
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from campaigns.inventory import claim_participant, claim_slot
+from campaigns.models import VaccineSchedule
+from .allocation import claim_second_doses, plan_second_doses, SecondDoseUnavailable
+from .gateway import query_transaction, validate_order, GatewayError, CURRENCY, PAID_STATUSES, UNPAID_STATUSES
+from .holds import holds, release
+from .models import Payment, VaccineRecord
+from . import rollups
+
+SUCCESS = 'success'
+FAIL = 'fail'
+CANCEL = 'cancel'
+
+# Outcomes returned by process_callback
+BOOKED = 'booked'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+DUPLICATE = 'duplicate'
+NOT_FOUND = 'not_found'
+CAMPAIGN_FULL = 'campaign_full'
+SLOT_FULL = 'slot_full'
+SECOND_DOSE_FULL = 'second_dose_full'
+SCHEDULE_GONE = 'schedule_unavailable'
+UNVERIFIED = 'unverified'
+
+SETTLEABLE = [Payment.PENDING, Payment.EXPIRED]
+
+
+class _Unavailable(Exception):
+    pass
+
+
+def payment_id_from_tran_id(tran_id):
+    """Our payment id from the ``txn_<id>`` tran_id sent to the gateway, or None."""
+    prefix, _, payment_id = (tran_id or '').partition('_')
+    if prefix != 'txn' or not payment_id.isdigit():
+        return None
+    return int(payment_id)
+
+
+def paid_in_full(answer, payment):
+    """Whether a gateway record of a completed payment is for the payment's amount in CURRENCY."""
+    try:
+        amount = Decimal(str(answer.get('amount')))
+    except InvalidOperation:
+        return False
+    return answer.get('currency') == CURRENCY and amount == payment.amount
+
+
+def verified_transaction(payment_id, val_id, gateway=None):
+    """
+    Ask the gateway whether `val_id` is a completed payment of this payment's
+    tran_id, amount and currency. Returns the gateway's transaction id for
+    it, or None when the gateway does not confirm it (or cannot be reached).
+    """
+    payment = Payment.objects.filter(pk=payment_id).only('amount').first()
+    if payment is None or not val_id:
+        return None
+    try:
+        answer = validate_order(val_id, gateway)
+    except GatewayError:
+        return None
+    if (answer.get('status') not in PAID_STATUSES or answer.get('tran_id') != f"txn_{payment_id}"
+            or not paid_in_full(answer, payment)):
+        return None
+    return answer.get('bank_tran_id') or val_id
+
+
+def verified_unpaid(payment_id, gateway=None):
+    """Whether the gateway reports the payment as failed, cancelled or expired."""
+    try:
+        element = query_transaction(f"txn_{payment_id}", gateway)
+    except GatewayError:
+        return False
+    return element is not None and element.get('status') in UNPAID_STATUSES
+
+
+def _book(payment, held):
+    """Create the paid booking in a savepoint. Returns None or the failure outcome."""
+    schedule = VaccineSchedule.objects.select_related('campaign').filter(pk=payment.schedule_id).first()
+    if schedule is None:
+        # The schedule was deleted while the patient was paying
+        if held:
+            release(payment)
+        return SCHEDULE_GONE
+    record = VaccineRecord(
+        patient_id=payment.patient_id,
+        campaign=schedule.campaign,
+        first_dose_schedule=schedule,
+        status=VaccineRecord.SCHEDULED
+    )
+    if held and VaccineSchedule.objects.filter(pk=payment.second_dose_schedule_id).exists():
+        # The hold reserved the second dose too
+        record.second_dose_schedule_id = payment.second_dose_schedule_id
+    try:
+        with transaction.atomic():
+            second_doses = plan_second_doses([record], first_doses_claimed=held)
+            # Without a live hold the cap or the slot may have gone while the
+            # patient was paying. The claims lock their rows until commit, so
+            # they come last, right before the INSERT
+            if not held and not claim_participant(schedule.campaign_id):
+                raise _Unavailable(CAMPAIGN_FULL)
+            if not held and not claim_slot(schedule.pk):
+                raise _Unavailable(SLOT_FULL)
+            claim_second_doses(second_doses)
+            record.save()
+            rollups.bookings_made([record])
+    except _Unavailable as e:
+        failure = str(e)
+    except SecondDoseUnavailable:
+        failure = SECOND_DOSE_FULL
+    else:
+        payment.record = record
+        return None
+
+    if held:
+        release(payment)
+    return failure
+
+
+def process_callback(payment_id, event, transaction_id=None):
+    """
+    Apply a gateway callback (`event` is SUCCESS, FAIL or CANCEL) to a
+    payment exactly once. Returns one of the outcome constants.
+    """
+    with transaction.atomic():
+        payment = Payment.objects.select_for_update().filter(pk=payment_id).first()
+        if payment is None:
+            return NOT_FOUND
+        if payment.payment_status not in SETTLEABLE:
+            return DUPLICATE
+        if event == SUCCESS and transaction_id and Payment.objects.filter(transaction_id=transaction_id).exists():
+            return DUPLICATE
+
+        held = holds(payment)
+        payment.hold_expires_at = None
+        if event == SUCCESS:
+            payment.payment_status = Payment.SUCCESS
+            payment.transaction_id = transaction_id or None
+            # Saved before booking so second-dose sizing does not count the hold twice
+            payment.save(update_fields=['payment_status', 'transaction_id', 'hold_expires_at'])
+            outcome = _book(payment, held) or BOOKED
+            if outcome != SCHEDULE_GONE:
+                rollups.payment_received(payment)
+            if outcome == BOOKED:
+                payment.save(update_fields=['record'])
+        else:
+            payment.payment_status = Payment.FAILED if event == FAIL else Payment.CANCELLED
+            outcome = FAILED if event == FAIL else CANCELLED
+            payment.save(update_fields=['payment_status', 'hold_expires_at'])
+            if held:
+                release(payment)
+    return outcome
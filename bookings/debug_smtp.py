@@ -0,0 +1,86 @@
+"""
+Local SMTP server that accepts every message and keeps it, for development
+and tests of the dose reminders.
+
+It speaks enough SMTP for Django's EmailBackend (EHLO/HELO, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT; no TLS or AUTH). Received messages are appended to
+``server.messages`` and each accepted connection is counted in
+``server.connections``. Point the app at it with EMAIL_HOST, EMAIL_PORT and
+EMAIL_USE_TLS=False (see the debug_smtp_server command).
+"""
+import threading
+from email import message_from_bytes
+from email.policy import default as default_policy
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+
+
+class DebugSMTPHandler(StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply('220 localhost debug SMTP ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode('utf-8', 'replace').strip().partition(' ')
+            command = command.upper()
+            if command == 'EHLO':
+                self.reply('250-localhost', '250 8BITMIME')
+            elif command == 'HELO':
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                sender, recipients = argument.partition(':')[2].strip(), []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipients.append(argument.partition(':')[2].strip())
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                self.receive(sender, recipients)
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif command in ('RSET', 'NOOP'):
+                sender, recipients = (None, []) if command == 'RSET' else (sender, recipients)
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+    def receive(self, sender, recipients):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b'.\r\n', b'.\n'):
+                break
+            # Undo dot-stuffing
+            lines.append(line[1:] if line.startswith(b'..') else line)
+        message = message_from_bytes(b''.join(lines), policy=default_policy)
+        with self.server.lock:
+            self.server.messages.append(message)
+        if self.server.verbose:
+            print(f"From {sender} to {', '.join(recipients)}: {message['Subject']}")
+
+    def reply(self, *lines):
+        self.wfile.write(''.join(f"{line}\r\n" for line in lines).encode())
+
+
+class DebugSMTPServer(ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+def make_server(host='127.0.0.1', port=0, verbose=False):
+    """A debug SMTP server bound to host:port (port 0 picks a free one); call serve_forever() to run it."""
+    server = DebugSMTPServer((host, port), DebugSMTPHandler)
+    server.messages = []
+    server.connections = 0
+    server.lock = threading.Lock()
+    server.verbose = verbose
+    return server
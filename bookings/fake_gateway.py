@@ -0,0 +1,119 @@
+"""
+Local stand-in for the SSLCommerz API, for development and benchmarks.
+
+It answers checkout session requests, transaction queries and val_id
+validations on the same paths as SSLCommerz, after an optional delay, and
+can fail a share of them with 503 to exercise retries. ``server.pay(tran_id,
+amount)`` records a completed payment and returns its val_id, as the real
+gateway would post it to the success callback. A transaction query reports
+that payment, the status set in ``server.transactions`` for the tran_id, or
+VALID for a ``paid_rate`` share of payments and FAILED for the rest. Those
+random answers carry no amount, so reconciliation leaves their VALID ones
+pending as mismatched; record payments with ``pay`` to have them settled.
+Connections are kept alive, like the real gateway's. Point the app at it
+with PAYMENT_GATEWAY_URL (see the fake_payment_gateway command).
+"""
+import json
+import random
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from .gateway import CURRENCY, SESSION_PATH, TRANSACTION_PATH, VALIDATION_PATH
+
+
+class FakeGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = parse_qs(self.rfile.read(length).decode())
+        if self.path != SESSION_PATH:
+            return self.reply(404, {'status': 'FAILED', 'failedreason': 'Unknown path'})
+
+        time.sleep(self.server.latency)
+        if random.random() < self.server.fail_rate:
+            return self.reply(503, {'status': 'FAILED', 'failedreason': 'Service unavailable'})
+
+        session_key = uuid.uuid4().hex
+        host, port = self.server.server_address[:2]
+        self.reply(200, {
+            'status': 'SUCCESS',
+            'sessionkey': session_key,
+            'tran_id': body.get('tran_id', [''])[0],
+            'GatewayPageURL': f"http://{host}:{port}/pay/{session_key}",
+        })
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path not in (TRANSACTION_PATH, VALIDATION_PATH):
+            return self.reply(404, {'status': 'FAILED', 'failedreason': 'Unknown path'})
+
+        time.sleep(self.server.latency)
+        if random.random() < self.server.fail_rate:
+            return self.reply(503, {'status': 'FAILED', 'failedreason': 'Service unavailable'})
+
+        if url.path == VALIDATION_PATH:
+            element = self.server.validations.get(params.get('val_id', [''])[0])
+            return self.reply(200, element or {'status': 'INVALID_TRANSACTION'})
+
+        tran_id = params.get('tran_id', [''])[0]
+        element = self.server.payments.get(tran_id)
+        if element is None:
+            status = self.server.transactions.get(tran_id)
+            if status is None:
+                status = 'VALID' if random.random() < self.server.paid_rate else 'FAILED'
+            element = None if status == 'UNATTEMPTED' else {
+                'tran_id': tran_id,
+                'status': status,
+                'val_id': uuid.uuid4().hex,
+                'bank_tran_id': f"fake-{tran_id}",
+            }
+        elements = [element] if element else []
+        self.reply(200, {'APIConnect': 'DONE', 'no_of_trans_found': len(elements), 'element': elements})
+
+    def reply(self, status, data):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class FakeGatewayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def pay(self, tran_id, amount):
+        """Record a completed payment of `amount` for `tran_id`. Returns its val_id."""
+        element = {
+            'tran_id': tran_id,
+            'status': 'VALID',
+            'val_id': uuid.uuid4().hex,
+            'amount': f"{amount:.2f}",
+            'currency': CURRENCY,
+            'bank_tran_id': f"fake-{tran_id}",
+        }
+        self.payments[tran_id] = element
+        self.validations[element['val_id']] = element
+        return element['val_id']
+
+
+def make_server(host='127.0.0.1', port=0, latency=0.0, fail_rate=0.0, paid_rate=0.5, verbose=False):
+    """A fake gateway bound to host:port (port 0 picks a free one); call serve_forever() to run it."""
+    server = FakeGatewayServer((host, port), FakeGatewayHandler)
+    server.latency = latency
+    server.fail_rate = fail_rate
+    server.paid_rate = paid_rate
+    server.transactions = {}
+    server.payments = {}
+    server.validations = {}
+    server.verbose = verbose
+    return server
@@ -0,0 +1,17 @@
+from django_filters import rest_framework as filters
+from .models import CampaignReview
+
+
+class CampaignReviewFilter(filters.FilterSet):
+    """
+    Review list filters. Every combination with a campaign is served by one
+    of the (campaign, ..., created_at) indexes on CampaignReview.
+    """
+    campaign_id = filters.NumberFilter(field_name='campaign_id')
+    rating = filters.NumberFilter(field_name='rating')
+    min_rating = filters.NumberFilter(field_name='rating', lookup_expr='gte')
+    since = filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+
+    class Meta:
+        model = CampaignReview
+        fields = ['campaign_id', 'rating', 'min_rating', 'since']
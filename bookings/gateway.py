@@ -0,0 +1,122 @@
+"""
+SSLCommerz gateway client.
+
+``SSLCOMMERZ`` from sslcommerz_lib opens a new connection, with a new TLS
+handshake, on every call. It also has no timeout and returns None on any
+error. The gateway here keeps one ``requests.Session`` per process, so
+connections are pooled and reused across requests. Every call has a connect
+and a read timeout. Connection failures and 502/503/504 answers are retried
+with exponential backoff; a request whose response was lost is not sent
+again. Failures raise GatewayError.
+
+Session creation is synchronous: ``initiate_payment`` is a DRF view served
+over WSGI, so the worker waits for the gateway, at most the connect and read
+timeouts per attempt.
+
+``validate_order`` asks the validation API about the ``val_id`` a success
+callback carries, and ``query_transaction`` what became of a payment. The
+callbacks are posted by the patient's browser, so they are only believed
+once the gateway confirms them; the reconciler uses ``query_transaction``
+for payments whose callback never arrived.
+"""
+from functools import lru_cache
+import requests
+from decouple import config
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from sslcommerz_lib import SSLCOMMERZ
+from urllib3.util.retry import Retry
+
+SESSION_PATH = '/gwprocess/v4/api.php'
+VALIDATION_PATH = '/validator/api/validationserverAPI.php'
+TRANSACTION_PATH = '/validator/api/merchantTransIDvalidationAPI.php'
+
+# Currency every checkout session is opened in
+CURRENCY = 'BDT'
+
+# Transaction statuses reported by the validation API for a completed payment
+PAID_STATUSES = {'VALID', 'VALIDATED'}
+# ... and for a payment that was declined or abandoned
+UNPAID_STATUSES = {'FAILED', 'CANCELLED', 'EXPIRED'}
+
+
+class GatewayError(Exception):
+    pass
+
+
+def build_session(pool_size, retries):
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504],
+        # The gateway has not processed a request it answered 502/503/504 to,
+        # so POSTs are retried as well
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class SSLCommerzGateway(SSLCOMMERZ):
+    """SSLCOMMERZ that sends its calls through a shared pooled session."""
+
+    def __init__(self, credentials, session, timeout, base_url=''):
+        super().__init__(credentials)
+        self.session = session
+        self.timeout = timeout
+        if base_url:
+            base_url = base_url.rstrip('/')
+            self.createSessionUrl = base_url + SESSION_PATH
+            self.validation_url = base_url + VALIDATION_PATH
+            self.transaction_url = base_url + TRANSACTION_PATH
+
+    def call_api(self, method, url, payload):
+        try:
+            if method == 'POST':
+                response = self.session.post(url, data=payload, timeout=self.timeout)
+            else:
+                response = self.session.get(url, params=payload, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise GatewayError(f"Payment gateway request failed: {e}") from e
+
+
+@lru_cache(maxsize=None)
+def get_gateway():
+    return SSLCommerzGateway(
+        {'store_id': config('Store_ID'), 'store_pass': config('store_pass'), 'issandbox': True},
+        build_session(settings.PAYMENT_GATEWAY_POOL_SIZE, settings.PAYMENT_GATEWAY_RETRIES),
+        (settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT, settings.PAYMENT_GATEWAY_READ_TIMEOUT),
+        settings.PAYMENT_GATEWAY_URL,
+    )
+
+
+def create_session(post_body):
+    """Open a checkout session. Returns the gateway's JSON answer."""
+    return get_gateway().createSession(post_body)
+
+
+def validate_order(val_id, gateway=None):
+    """The validation API's record of the payment with `val_id`."""
+    return (gateway or get_gateway()).validationTransactionOrder(val_id)
+
+
+def query_transaction(tran_id, gateway=None):
+    """
+    The gateway's record of our `tran_id`: the paid attempt if there is one,
+    otherwise the latest, or None when the patient never got to pay.
+    """
+    answer = (gateway or get_gateway()).transaction_query_tranid(tran_id)
+    elements = answer.get('element') or []
+    for element in elements:
+        if element.get('status') in PAID_STATUSES:
+            return element
+    return elements[-1] if elements else None
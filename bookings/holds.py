@@ -0,0 +1,116 @@
+"""
+Slot holds for premium bookings.
+
+Creating the PENDING Payment for a premium booking claims the first-dose
+slot, the second-dose slot and a participant place right away, and stamps
+the payment with ``hold_expires_at``. A successful payment turns the hold
+into the booking; everything it needs is already reserved, so a paid hold
+always books.
+A failed or cancelled payment gives it back at once. Holds nobody paid for
+are released by ``release_expired_holds``: one indexed query per run finds
+them, and one UPDATE per table returns their capacity.
+"""
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from campaigns.inventory import (
+    claim_participant, claim_slot, release_participant, release_participants, release_slots
+)
+from .allocation import claim_second_doses, plan_second_doses, SecondDoseUnavailable
+from .models import Payment, VaccineRecord
+
+
+class HoldUnavailable(Exception):
+    pass
+
+
+def active_hold(patient, campaign):
+    return Payment.objects.filter(
+        patient=patient,
+        campaign_id=campaign.id,
+        payment_status=Payment.PENDING,
+        hold_expires_at__gt=timezone.now()
+    ).first()
+
+
+def create_hold(patient, campaign, schedule):
+    """
+    Create a PENDING payment that holds a slot on `schedule`, and the slot
+    of its second dose, for PAYMENT_HOLD_TTL seconds. Raises HoldUnavailable
+    when the campaign, the schedule or the second-dose window is full.
+    """
+    if not claim_participant(campaign.id):
+        raise HoldUnavailable("This campaign has reached its participant limit.")
+    probe = VaccineRecord(campaign=campaign, first_dose_schedule=schedule)
+    try:
+        with transaction.atomic():
+            # The slot claims lock their rows until commit, so they come last
+            second_doses = plan_second_doses([probe], first_doses_claimed=False)
+            claimed = claim_slot(schedule.id)
+            if claimed:
+                try:
+                    claim_second_doses(second_doses)
+                except SecondDoseUnavailable as e:
+                    # Rolls the first-dose claim back with the savepoint
+                    raise HoldUnavailable(str(e))
+                payment = Payment.objects.create(
+                    patient=patient,
+                    record=None,
+                    amount=campaign.premium_price or 0,
+                    payment_status=Payment.PENDING,
+                    campaign_id=campaign.id,
+                    schedule_id=schedule.id,
+                    second_dose_schedule_id=probe.second_dose_schedule_id,
+                    hold_expires_at=timezone.now() + timedelta(seconds=settings.PAYMENT_HOLD_TTL)
+                )
+    except Exception:
+        # The slot claim rolled back with the payment; the place was claimed outside it
+        release_participant(campaign.id)
+        raise
+    if not claimed:
+        release_participant(campaign.id)
+        raise HoldUnavailable("No available slots.")
+    return payment
+
+
+def holds(payment):
+    """Whether a payment row (locked by the caller) still holds its slot."""
+    return payment.payment_status == Payment.PENDING and payment.hold_expires_at is not None
+
+
+def held_slots(rows):
+    """Slots held per schedule by (schedule_id, second_dose_schedule_id) pairs."""
+    counts = Counter()
+    for schedule_id, second_dose_schedule_id in rows:
+        counts[schedule_id] += 1
+        if second_dose_schedule_id:
+            counts[second_dose_schedule_id] += 1
+    return counts
+
+
+def release(payment):
+    """Give back the slots and participant place held by a payment locked by the caller."""
+    release_slots(held_slots([(payment.schedule_id, payment.second_dose_schedule_id)]))
+    release_participant(payment.campaign_id)
+
+
+def release_expired_holds(now=None):
+    """Expire every unpaid hold past its deadline. Returns the number released."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        expired = list(
+            Payment.objects.select_for_update(skip_locked=True)
+            .filter(payment_status=Payment.PENDING, hold_expires_at__lte=now)
+            .values_list('id', 'schedule_id', 'second_dose_schedule_id', 'campaign_id')
+        )
+        if not expired:
+            return 0
+        Payment.objects.filter(id__in=[row[0] for row in expired]).update(
+            payment_status=Payment.EXPIRED,
+            hold_expires_at=None
+        )
+        release_slots(held_slots(row[1:3] for row in expired))
+        release_participants(Counter(row[3] for row in expired))
+    return len(expired)
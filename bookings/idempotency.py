@@ -0,0 +1,104 @@
+"""
+Idempotency-Key support for POST endpoints that must not run twice.
+
+The first request with a given key reserves a row, runs the view and stores
+its response. Retries with the same key are answered from that row with one
+indexed lookup: the stored response is replayed, a request that is still
+running gets 409, and a key reused for a different request gets 422.
+Server errors are not stored, so the client can retry them. Rows expire
+after IDEMPOTENCY_KEY_TTL seconds and are deleted by
+``purge_idempotency_keys``.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.get_full_path().encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _reserve(request, key, fingerprint):
+    """Create the key's row, or return the live row that already holds it."""
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    user=request.user, key=key, request_hash=fingerprint, expires_at=expires_at
+                )
+            return None
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if existing is not None and existing.expires_at > now:
+                return existing
+            # Expired but not purged yet: reuse the key
+            IdempotencyKey.objects.filter(user=request.user, key=key, expires_at__lte=now).delete()
+    return None
+
+
+def _replay(existing, fingerprint):
+    if existing.request_hash != fingerprint:
+        return Response(
+            {'detail': f"This {HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if existing.status_code is None:
+        return Response(
+            {'detail': f"A request with this {HEADER} is still being processed."},
+            status=status.HTTP_409_CONFLICT
+        )
+    return Response(existing.response_body, status=existing.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(view):
+    """
+    Make a POST view replay its first response for retries carrying the same
+    Idempotency-Key header. Works on function views and viewset actions;
+    requests without the header run normally.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, Request))
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or not key or not request.user.is_authenticated:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request)
+        existing = _reserve(request, key, fingerprint)
+        if existing is not None:
+            return _replay(existing, fingerprint)
+
+        reservation = IdempotencyKey.objects.filter(user=request.user, key=key)
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            reservation.delete()
+            raise
+        if response.status_code >= 500 or not hasattr(response, 'data'):
+            reservation.delete()
+        else:
+            reservation.update(status_code=response.status_code, response_body=response.data)
+        return response
+
+    return wrapper
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_alter_campaignreview_unique_together'),
+        ('campaigns', '0014_schedule_unique_window'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to=settings.AUTH_USER_MODEL)),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='campaigns.vaccineschedule')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['schedule', 'id'], name='waitlist_schedule_fifo_idx')],
+                'constraints': [models.UniqueConstraint(fields=('schedule', 'patient'), name='waitlist_unique_patient')],
+            },
+        ),
+    ]
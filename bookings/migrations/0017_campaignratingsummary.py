@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_summaries(apps, schema_editor):
+    CampaignReview = apps.get_model('bookings', 'CampaignReview')
+    CampaignRatingSummary = apps.get_model('bookings', 'CampaignRatingSummary')
+    rows = CampaignReview.objects.values('campaign').order_by().annotate(
+        review_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in range(1, 6)}
+    )
+    CampaignRatingSummary.objects.bulk_create(
+        [CampaignRatingSummary(campaign_id=row.pop('campaign'), **row) for row in rows],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0016_payment_created_at'),
+        ('campaigns', '0014_schedule_unique_window'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignRatingSummary',
+            fields=[
+                ('campaign', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='campaigns.vaccinecampaign')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_1', models.PositiveIntegerField(default=0)),
+                ('rating_2', models.PositiveIntegerField(default=0)),
+                ('rating_3', models.PositiveIntegerField(default=0)),
+                ('rating_4', models.PositiveIntegerField(default=0)),
+                ('rating_5', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_rating_summaries, migrations.RunPython.noop),
+    ]
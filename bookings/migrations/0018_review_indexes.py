@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0017_campaignratingsummary'),
+        ('campaigns', '0014_schedule_unique_window'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='campaignreview',
+            index=models.Index(fields=['campaign', '-created_at', '-id'], name='review_campaign_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaignreview',
+            index=models.Index(fields=['campaign', 'rating', '-created_at', '-id'], name='review_campaign_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='campaignreview',
+            index=models.Index(fields=['-created_at', '-id'], name='review_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:58
+
+import django.db.models.deletion
+from collections import defaultdict
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    VaccineCampaign = apps.get_model('campaigns', 'VaccineCampaign')
+    VaccineRecord = apps.get_model('bookings', 'VaccineRecord')
+    Payment = apps.get_model('bookings', 'Payment')
+    CampaignDailyStats = apps.get_model('bookings', 'CampaignDailyStats')
+    days = defaultdict(dict)
+    queries = [
+        ('bookings', VaccineRecord.objects.annotate(day=TruncDate('created_at')), Count('id')),
+        ('first_doses', VaccineRecord.objects.annotate(day=F('first_dose_schedule__date')), Count('id')),
+        ('second_doses', VaccineRecord.objects.filter(second_dose_schedule__isnull=False)
+            .annotate(day=F('second_dose_schedule__date')), Count('id')),
+        ('revenue', Payment.objects.filter(payment_status='SUCCESS', campaign_id__in=VaccineCampaign.objects.values('pk'))
+            .annotate(campaign=F('campaign_id'), day=TruncDate('created_at')), Sum('amount')),
+    ]
+    for field, queryset, total in queries:
+        for campaign_id, day, value in queryset.values('campaign', 'day').order_by().annotate(
+            value=total
+        ).values_list('campaign', 'day', 'value'):
+            days[campaign_id, day][field] = value or 0
+    CampaignDailyStats.objects.bulk_create(
+        [CampaignDailyStats(campaign_id=campaign_id, date=day, **values) for (campaign_id, day), values in days.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0018_review_indexes'),
+        ('campaigns', '0014_schedule_unique_window'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CampaignDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('cancellations', models.IntegerField(default=0)),
+                ('first_doses', models.IntegerField(default=0)),
+                ('second_doses', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='campaigns.vaccinecampaign')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('campaign', 'date'), name='daily_stats_unique_day')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
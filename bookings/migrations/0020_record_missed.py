@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0019_campaigndailystats'),
+        ('campaigns', '0014_schedule_unique_window'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='campaigndailystats',
+            name='missed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='vaccinerecord',
+            index=models.Index(fields=['status', 'id'], name='record_status_id_idx'),
+        ),
+    ]
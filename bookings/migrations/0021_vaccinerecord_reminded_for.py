@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0020_record_missed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vaccinerecord',
+            name='reminded_for',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 00:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0021_vaccinerecord_reminded_for'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='second_dose_schedule_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+"""
+Marking of missed doses.
+
+Records only know SCHEDULED, COMPLETED and MISSED, not which doses were
+given. So a record still SCHEDULED after its last scheduled dose (the
+second dose when it has one, otherwise the first) has passed was never
+completed, and it is marked MISSED. A patient between the two doses keeps
+SCHEDULED and their second-dose slot.
+
+Overdue records are read in id order along the (status, id) index, a chunk
+at a time, and each chunk is settled in its own short transaction: the
+chunk's rows are locked with SKIP LOCKED, so records a cancellation is
+deleting right now are left for the next run, and marked MISSED with one
+UPDATE. The analytics rollups are adjusted after commit. No lock is held
+across chunks, so bookings and cancellations keep going while a large
+backlog is processed.
+"""
+from collections import Counter
+from datetime import timedelta
+from django.db import transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from . import rollups
+from .models import VaccineRecord
+
+BATCH_SIZE = 1000
+
+STAT_KEYS = ['missed']
+
+
+def overdue_records(cutoff):
+    """Records whose last scheduled dose was before `cutoff` and that were never completed."""
+    return VaccineRecord.objects.annotate(
+        last_dose_date=Coalesce('second_dose_schedule__date', 'first_dose_schedule__date')
+    ).filter(status=VaccineRecord.SCHEDULED, last_dose_date__lt=cutoff)
+
+
+def mark_chunk(ids, cutoff, stats):
+    with transaction.atomic():
+        rows = list(
+            overdue_records(cutoff).select_for_update(skip_locked=True, of=('self',))
+            .filter(pk__in=ids)
+            .values_list('id', 'campaign_id', 'last_dose_date')
+        )
+        if not rows:
+            return
+        VaccineRecord.objects.filter(pk__in=[row[0] for row in rows]).update(
+            status=VaccineRecord.MISSED, updated_at=timezone.now()
+        )
+        rollups.records_missed([(campaign_id, day) for _, campaign_id, day in rows])
+    stats['missed'] += len(rows)
+
+
+def mark_missed_doses(grace_days=0, batch_size=BATCH_SIZE, progress=None):
+    """
+    Mark records missed once their last scheduled dose is more than
+    `grace_days` days past. Calls `progress(stats)` after every chunk.
+    Returns the counts by STAT_KEYS.
+    """
+    cutoff = timezone.localdate() - timedelta(days=grace_days)
+    overdue = overdue_records(cutoff)
+    stats = Counter({key: 0 for key in STAT_KEYS})
+    last = 0
+    while True:
+        ids = list(overdue.filter(pk__gt=last).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return stats
+        mark_chunk(ids, cutoff, stats)
+        last = ids[-1]
+        if progress:
+            progress(stats)
@@ -1,8 +1,9 @@
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from campaigns.models import VaccineCampaign, VaccineSchedule
+import uuid
 from django.conf import settings
-from datetime import timedelta
+from rest_framework.utils.encoders import JSONEncoder
 from django.utils import timezone
 
 class VaccineRecord(models.Model):
@@ -21,35 +22,78 @@ class VaccineRecord(models.Model):
     first_dose_schedule = models.ForeignKey(VaccineSchedule, on_delete=models.CASCADE, related_name='first_dose_bookings')
     second_dose_schedule = models.ForeignKey(VaccineSchedule, on_delete=models.CASCADE, related_name='second_dose_bookings',null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=SCHEDULED)
+    # Date of the last dose send_dose_reminders reminded the patient of
+    reminded_for = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
-    def save(self, *args, **kwargs):
-        if not self.second_dose_schedule and self.first_dose_schedule:
-            gap_days = self.campaign.dosage_interval_days
-            second_dose_date = self.first_dose_schedule.date + timedelta(days=gap_days)
-            
-            second_schedule = VaccineSchedule.objects.filter(
-                campaign=self.campaign,
-                date=second_dose_date
-            ).first()
-            
-            if not second_schedule:
-                second_schedule = VaccineSchedule.objects.create(
-                    campaign=self.campaign,
-                    date=second_dose_date,
-                    available_slots=10,
-                    start_time=self.first_dose_schedule.start_time,
-                    end_time=self.first_dose_schedule.end_time
-                )
-            
-            self.second_dose_schedule = second_schedule
-        
-        super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            # mark_missed_doses walks SCHEDULED records in id order
+            models.Index(fields=['status', 'id'], name='record_status_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.patient.get_full_name()} - {self.campaign.name}"
 
+class WaitlistEntry(models.Model):
+    """A patient waiting for a slot on a full schedule, served first come first served."""
+    schedule = models.ForeignKey(VaccineSchedule, on_delete=models.CASCADE, related_name='waitlist')
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='waitlist_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'patient'], name='waitlist_unique_patient'),
+        ]
+        indexes = [
+            models.Index(fields=['schedule', 'id'], name='waitlist_schedule_fifo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.patient} waiting for {self.schedule}"
+
+class BookingRequest(models.Model):
+    """
+    A booking accepted in queued mode. The client gets the ticket at once and
+    process_booking_queue turns pending requests into records in batches.
+    """
+    PENDING = 'PENDING'
+    BOOKED = 'BOOKED'
+    FAILED = 'FAILED'
+
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (BOOKED, 'Booked'),
+        (FAILED, 'Failed'),
+    ]
+
+    ticket = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='booking_requests')
+    campaign = models.ForeignKey(VaccineCampaign, on_delete=models.CASCADE, related_name='booking_requests')
+    schedule = models.ForeignKey(VaccineSchedule, on_delete=models.CASCADE, related_name='booking_requests')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    detail = models.CharField(max_length=255, blank=True)
+    record = models.OneToOneField(VaccineRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='booking_request')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['patient', 'campaign'],
+                condition=models.Q(status='PENDING'),
+                name='booking_request_one_pending'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'id'], name='booking_request_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Booking request {self.ticket} ({self.status})"
+
 class CampaignReview(models.Model):
     patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reviews')
     campaign = models.ForeignKey(VaccineCampaign, on_delete=models.CASCADE, related_name='reviews')
@@ -57,21 +101,88 @@ class CampaignReview(models.Model):
     comment = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
+
+    class Meta:
+        indexes = [
+            # Newest-first review pages, per campaign and overall
+            models.Index(fields=['campaign', '-created_at', '-id'], name='review_campaign_recent_idx'),
+            models.Index(fields=['campaign', 'rating', '-created_at', '-id'], name='review_campaign_rating_idx'),
+            models.Index(fields=['-created_at', '-id'], name='review_recent_idx'),
+        ]
     
     def __str__(self):
         return f"Review by {self.patient.user.get_full_name()} for {self.campaign.name}"
     
 
+class CampaignRatingSummary(models.Model):
+    """
+    Review aggregates of a campaign, kept up to date by bookings.ratings in
+    the same transaction as every review change.
+    """
+    campaign = models.OneToOneField(
+        VaccineCampaign, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary'
+    )
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_1 = models.PositiveIntegerField(default=0)
+    rating_2 = models.PositiveIntegerField(default=0)
+    rating_3 = models.PositiveIntegerField(default=0)
+    rating_4 = models.PositiveIntegerField(default=0)
+    rating_5 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def average(self):
+        if not self.review_count:
+            return None
+        return round(self.rating_sum / self.review_count, 2)
+
+    @property
+    def histogram(self):
+        return {str(rating): getattr(self, f'rating_{rating}') for rating in range(1, 6)}
+
+    def __str__(self):
+        return f"Ratings for {self.campaign_id}: {self.average} ({self.review_count})"
+
+
+class CampaignDailyStats(models.Model):
+    """
+    Daily rollup of a campaign for the doctor analytics endpoint, maintained
+    by bookings.rollups. Bookings, cancellations and revenue count on the day
+    they happened; first and second doses count on the day they are scheduled,
+    and missed bookings on the day of their last scheduled dose.
+    """
+    campaign = models.ForeignKey(VaccineCampaign, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    bookings = models.IntegerField(default=0)
+    cancellations = models.IntegerField(default=0)
+    first_doses = models.IntegerField(default=0)
+    second_doses = models.IntegerField(default=0)
+    missed = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'date'], name='daily_stats_unique_day'),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.campaign_id} on {self.date}"
+
+
 class Payment(models.Model):
     PENDING = 'PENDING'
     SUCCESS = 'SUCCESS'
     FAILED = 'FAILED'
+    CANCELLED = 'CANCELLED'
+    EXPIRED = 'EXPIRED'
 
     STATUS_CHOICES = [
         (PENDING, 'Pending'),
         (SUCCESS, 'Success'),
         (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+        (EXPIRED, 'Expired'),
     ]
 
     patient = models.ForeignKey(
@@ -89,8 +200,46 @@ class Payment(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     payment_status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
 
-    campaign_id = models.IntegerField(null=True, blank=True)
-    schedule_id = models.IntegerField(null=True, blank=True)
+    campaign_id = models.IntegerField(null=True, blank=True, db_index=True)
+    schedule_id = models.IntegerField(null=True, blank=True, db_index=True)
+    # Second-dose slot reserved with the held first-dose slot, so a paid
+    # hold always books; released together with it
+    second_dose_schedule_id = models.IntegerField(null=True, blank=True)
+    # Set while the payment holds a slot and a participant place; cleared on
+    # success, failure or expiry
+    hold_expires_at = models.DateTimeField(null=True, blank=True)
+    # Gateway transaction (SSLCommerz bank_tran_id) that paid this payment;
+    # unique, so one gateway transaction can never pay for two bookings
+    transaction_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['payment_status', 'hold_expires_at'], name='payment_hold_expiry_idx'),
+            # reconcile_payments pages through stale unsettled payments
+            models.Index(fields=['payment_status', 'created_at', 'id'], name='payment_status_created_idx'),
+        ]
     
     def __str__(self):
-        return f"Payment for {self.record} - {self.payment_status}"
\ No newline at end of file
+        return f"Payment for {self.record} - {self.payment_status}"
+
+class IdempotencyKey(models.Model):
+    """
+    The stored response to a POST sent with an Idempotency-Key header.
+    A row without a status_code is a request still being processed.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=JSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_unique_user_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status_code or 'pending'})"
@@ -0,0 +1,66 @@
+"""
+Per-campaign rating summaries.
+
+Each campaign's CampaignRatingSummary holds its review count, rating sum and
+1-5 histogram. Review create, update and delete adjust it with one
+F()-expression UPDATE in the same transaction, so reading a campaign's
+ratings never scans its reviews. ``rebuild_summaries`` recomputes every
+summary from one grouped query; use it after reviews were changed outside
+the API (e.g. patients deleted with their reviews).
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from .models import CampaignRatingSummary, CampaignReview
+
+RATINGS = range(1, 6)
+
+
+def summary_for(campaign_id):
+    """The campaign's summary, or an empty unsaved one if it has no reviews yet."""
+    summary = CampaignRatingSummary.objects.filter(campaign_id=campaign_id).first()
+    return summary or CampaignRatingSummary(campaign_id=campaign_id)
+
+
+def apply_review_change(campaign_id, old_rating=None, new_rating=None):
+    """
+    Record a review created (`old_rating` None), re-rated, or deleted
+    (`new_rating` None) in the campaign's summary. Call it inside the
+    transaction that changes the review.
+    """
+    if old_rating == new_rating:
+        return
+    changes = {
+        'review_count': F('review_count') + (new_rating is not None) - (old_rating is not None),
+        'rating_sum': F('rating_sum') + (new_rating or 0) - (old_rating or 0),
+        'updated_at': timezone.now(),
+    }
+    if old_rating:
+        changes[f'rating_{old_rating}'] = F(f'rating_{old_rating}') - 1
+    if new_rating:
+        changes[f'rating_{new_rating}'] = F(f'rating_{new_rating}') + 1
+
+    summaries = CampaignRatingSummary.objects.filter(campaign_id=campaign_id)
+    if not summaries.update(**changes):
+        # First review of the campaign; a concurrent first review may create the row too
+        CampaignRatingSummary.objects.bulk_create(
+            [CampaignRatingSummary(campaign_id=campaign_id)], ignore_conflicts=True
+        )
+        summaries.update(**changes)
+
+
+def rebuild_summaries():
+    """Recompute every summary from one grouped query. Returns the number of campaigns with reviews."""
+    with transaction.atomic():
+        rows = CampaignReview.objects.values('campaign').order_by().annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'rating_{rating}': Count('id', filter=Q(rating=rating)) for rating in RATINGS}
+        )
+        summaries = [
+            CampaignRatingSummary(campaign_id=row.pop('campaign'), **row)
+            for row in rows
+        ]
+        CampaignRatingSummary.objects.all().delete()
+        CampaignRatingSummary.objects.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
@@ -0,0 +1,134 @@
+"""
+Reconciliation of payments whose gateway callback never arrived.
+
+Unsettled payments (PENDING, or EXPIRED holds that may still have been
+paid) older than a cutoff are read in pages along the
+(payment_status, created_at, id) index with keyset pagination. For each
+page the gateway is asked about every payment at once from a small thread
+pool, sharing the pooled gateway session. Then:
+
+* paid payments are settled through ``process_callback``, exactly like a
+  late success callback, so they are booked at most once. The gateway's
+  amount and currency are checked first, as for a live callback; a payment
+  paid for a different amount is left pending for manual review;
+* failed, cancelled and never-attempted payments are closed with one UPDATE
+  per new status, and the slots and participant places they still held are
+  released with one UPDATE per table;
+* payments the gateway still reports as in progress, or could not answer
+  for, are left for the next run.
+"""
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from campaigns.inventory import release_participants, release_slots
+from .callbacks import paid_in_full, process_callback, SUCCESS, BOOKED, DUPLICATE, SETTLEABLE
+from .gateway import query_transaction, GatewayError, PAID_STATUSES
+from .holds import held_slots
+from .models import Payment
+
+BATCH_SIZE = 200
+CONCURRENCY = 8
+
+# Gateway statuses that close a payment without booking
+CLOSED_STATUSES = {
+    'FAILED': Payment.FAILED,
+    'CANCELLED': Payment.CANCELLED,
+    'EXPIRED': Payment.FAILED,
+    'UNATTEMPTED': Payment.FAILED,
+}
+
+STAT_KEYS = ['checked', 'booked', 'paid_unbooked', 'mismatched', 'closed', 'open', 'errors']
+
+
+def stale_payments(cutoff, oldest, batch_size=BATCH_SIZE):
+    """Yield pages of unsettled payments created between `oldest` and `cutoff`, oldest first."""
+    last = None
+    while True:
+        page = Payment.objects.filter(
+            payment_status__in=SETTLEABLE, created_at__gte=oldest, created_at__lte=cutoff
+        )
+        if last is not None:
+            page = page.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        page = list(page.order_by('created_at', 'id').only('id', 'created_at', 'amount')[:batch_size])
+        if not page:
+            return
+        yield page
+        last = (page[-1].created_at, page[-1].id)
+
+
+def _query(payment_id, gateway):
+    try:
+        return payment_id, query_transaction(f"txn_{payment_id}", gateway), None
+    except GatewayError as e:
+        return payment_id, None, e
+
+
+def close_payments(statuses):
+    """
+    Close unsettled payments without booking; `statuses` maps payment id to
+    the new status. Returns the number closed.
+    """
+    with transaction.atomic():
+        rows = list(
+            Payment.objects.select_for_update(skip_locked=True)
+            .filter(id__in=statuses, payment_status__in=SETTLEABLE)
+            .values_list('id', 'schedule_id', 'second_dose_schedule_id', 'campaign_id', 'hold_expires_at')
+        )
+        if not rows:
+            return 0
+        by_status = defaultdict(list)
+        for row in rows:
+            by_status[statuses[row[0]]].append(row[0])
+        for new_status, ids in by_status.items():
+            Payment.objects.filter(id__in=ids).update(payment_status=new_status, hold_expires_at=None)
+
+        held = [row for row in rows if row[4] is not None]
+        release_slots(held_slots(row[1:3] for row in held))
+        release_participants(Counter(row[3] for row in held))
+    return len(rows)
+
+
+def reconcile_page(page, stats, gateway=None, concurrency=CONCURRENCY):
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        answers = list(pool.map(lambda payment: _query(payment.id, gateway), page))
+
+    payments = {payment.id: payment for payment in page}
+    closing = {}
+    for payment_id, element, error in answers:
+        stats['checked'] += 1
+        if error is not None:
+            stats['errors'] += 1
+        elif element is None:
+            closing[payment_id] = CLOSED_STATUSES['UNATTEMPTED']
+        elif element.get('status') in PAID_STATUSES:
+            if not paid_in_full(element, payments[payment_id]):
+                stats['mismatched'] += 1
+                continue
+            outcome = process_callback(payment_id, SUCCESS, element.get('bank_tran_id'))
+            if outcome == BOOKED:
+                stats['booked'] += 1
+            elif outcome != DUPLICATE:
+                stats['paid_unbooked'] += 1
+        elif element.get('status') in CLOSED_STATUSES:
+            closing[payment_id] = CLOSED_STATUSES[element['status']]
+        else:
+            stats['open'] += 1
+    stats['closed'] += close_payments(closing)
+
+
+def reconcile(older_than=timedelta(minutes=30), max_age=timedelta(days=3), batch_size=BATCH_SIZE,
+              concurrency=CONCURRENCY, gateway=None, progress=None):
+    """
+    Reconcile unsettled payments created between `max_age` and `older_than`
+    ago. Calls `progress(stats)` after every page. Returns the counts by STAT_KEYS.
+    """
+    now = timezone.now()
+    stats = Counter({key: 0 for key in STAT_KEYS})
+    for page in stale_payments(now - older_than, now - max_age, batch_size):
+        reconcile_page(page, stats, gateway, concurrency)
+        if progress:
+            progress(stats)
+    return stats
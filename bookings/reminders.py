@@ -0,0 +1,137 @@
+"""
+Reminder emails for the next day's first and second doses.
+
+The day's schedules are found on the schedule date index, and their
+bookings are read in id order a batch at a time, with the patient, campaign
+and schedule fields in the same query. The template is compiled once and
+each batch is rendered in memory. Then the batch is sent over one SMTP
+connection that is opened for it and closed after it, instead of a connect,
+EHLO, TLS handshake and login per message. Sends can be paced to a rate
+limit (REMINDER_RATE_LIMIT messages per second) for providers that throttle.
+
+Each booking records the appointment date it was reminded for, with one
+UPDATE per batch, so running the dispatcher again the same day only sends
+what failed or was not sent yet. Run one dispatcher at a time.
+"""
+import smtplib
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+from campaigns.models import VaccineSchedule
+from .models import VaccineRecord
+
+BATCH_SIZE = 200
+TEMPLATE = 'bookings/dose_reminder.txt'
+
+STAT_KEYS = ['sent', 'failed']
+
+FIELDS = [
+    'id', 'first_dose_schedule_id', 'second_dose_schedule_id', 'patient__email', 'patient__first_name',
+    'campaign__name', 'campaign__vaccine_type', 'campaign__location',
+]
+
+
+def due_reminders(day):
+    """Scheduled bookings with a dose on `day` that were not reminded yet, and the day's schedules by id."""
+    schedules = VaccineSchedule.objects.filter(date=day).in_bulk()
+    records = VaccineRecord.objects.filter(
+        Q(first_dose_schedule_id__in=schedules) | Q(second_dose_schedule_id__in=schedules),
+        status=VaccineRecord.SCHEDULED
+    ).exclude(reminded_for=day)
+    return records, schedules
+
+
+def render_batch(rows, day, schedules, template):
+    """One EmailMessage per row of FIELDS, keyed by record id."""
+    messages = {}
+    for row in rows:
+        first = row['first_dose_schedule_id'] in schedules
+        schedule = schedules[row['first_dose_schedule_id'] if first else row['second_dose_schedule_id']]
+        body = template.render({
+            'name': row['patient__first_name'] or row['patient__email'],
+            'dose': 'first' if first else 'second',
+            'vaccine_type': row['campaign__vaccine_type'],
+            'campaign': row['campaign__name'],
+            'location': row['campaign__location'],
+            'date': day,
+            'start_time': schedule.start_time,
+            'end_time': schedule.end_time,
+        })
+        messages[row['id']] = EmailMessage(
+            f"Reminder: your {row['campaign__vaccine_type']} dose on {day:%d %b}",
+            body,
+            to=[row['patient__email']],
+        )
+    return messages
+
+
+class RateLimiter:
+    """Spaces calls to wait() at most `rate` per second; a rate of 0 never waits."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self.next_at:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def send_batch(messages, limiter, stats):
+    """Send `messages` ({record id: message}) over one connection. Returns the ids sent."""
+    sent = []
+    connection = get_connection(fail_silently=False)
+    opened = False
+    try:
+        for record_id, message in messages.items():
+            limiter.wait()
+            try:
+                # Opened once for the batch, and again only after a failure dropped it
+                if not opened:
+                    connection.open()
+                    opened = True
+                connection.send_messages([message])
+            except (smtplib.SMTPException, OSError):
+                stats['failed'] += 1
+                connection.close()
+                opened = False
+                continue
+            sent.append(record_id)
+            stats['sent'] += 1
+    finally:
+        connection.close()
+    return sent
+
+
+def send_reminders(day=None, batch_size=BATCH_SIZE, rate=None, progress=None):
+    """
+    Remind the patients with a dose on `day` (tomorrow by default), at most
+    `rate` messages per second (REMINDER_RATE_LIMIT by default). Calls
+    `progress(stats)` after every batch. Returns the counts by STAT_KEYS.
+    """
+    day = day or timezone.localdate() + timedelta(days=1)
+    limiter = RateLimiter(settings.REMINDER_RATE_LIMIT if rate is None else rate)
+    template = get_template(TEMPLATE)
+    records, schedules = due_reminders(day)
+    stats = Counter({key: 0 for key in STAT_KEYS})
+    last = 0
+    while True:
+        rows = list(
+            records.filter(pk__gt=last).order_by('id').values(*FIELDS)[:batch_size]
+        )
+        if not rows:
+            return stats
+        sent = send_batch(render_batch(rows, day, schedules, template), limiter, stats)
+        VaccineRecord.objects.filter(pk__in=sent).update(reminded_for=day)
+        last = rows[-1]['id']
+        if progress:
+            progress(stats)
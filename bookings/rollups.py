@@ -0,0 +1,179 @@
+"""
+Daily campaign rollups behind the doctor analytics endpoint.
+
+The booking, cancellation and payment paths report what they did here.
+The changes are grouped per (campaign, day) and applied after the
+transaction commits, as one INSERT ... ON CONFLICT DO NOTHING for missing
+days plus one UPDATE of F() + CASE increments. So a booking never waits on
+another booking's rollup row. If the process dies between the commit and
+the rollup, ``rebuild_rollups`` recomputes the rows from the records and
+payments with one grouped query each. Cancellations are not recomputed,
+since cancelled records are deleted. Missed bookings are counted on the
+day of their last scheduled dose.
+"""
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from campaigns.models import VaccineCampaign, VaccineSchedule
+from .models import CampaignDailyStats, Payment, VaccineRecord
+
+COUNTERS = ['bookings', 'cancellations', 'first_doses', 'second_doses', 'missed']
+FIELDS = COUNTERS + ['revenue']
+
+
+def _new_deltas():
+    return defaultdict(lambda: defaultdict(int))
+
+
+def apply(deltas):
+    """Add `deltas` ({(campaign_id, date): {field: change}}) to the rollup rows now."""
+    deltas = {key: changes for key, changes in deltas.items() if any(changes.values())}
+    if not deltas:
+        return
+    CampaignDailyStats.objects.bulk_create(
+        [CampaignDailyStats(campaign_id=campaign_id, date=date) for campaign_id, date in deltas],
+        ignore_conflicts=True
+    )
+    rows = Q()
+    for campaign_id, date in deltas:
+        rows |= Q(campaign_id=campaign_id, date=date)
+    updates = {}
+    for field in FIELDS:
+        output = DecimalField(max_digits=12, decimal_places=2) if field == 'revenue' else IntegerField()
+        whens = [
+            When(campaign_id=campaign_id, date=date, then=Value(changes[field], output_field=output))
+            for (campaign_id, date), changes in deltas.items() if changes.get(field)
+        ]
+        if whens:
+            updates[field] = F(field) + Case(*whens, default=Value(0, output_field=output), output_field=output)
+    CampaignDailyStats.objects.filter(rows).update(**updates)
+
+
+def _on_commit(deltas):
+    # A failed rollup is logged, not raised: the booking has already committed
+    transaction.on_commit(lambda: apply(deltas), robust=True)
+
+
+def bookings_made(records):
+    """Count new records; their schedules must be set (as every booking path does)."""
+    today = timezone.localdate()
+    deltas = _new_deltas()
+    for record in records:
+        deltas[record.campaign_id, today]['bookings'] += 1
+        deltas[record.campaign_id, record.first_dose_schedule.date]['first_doses'] += 1
+        if record.second_dose_schedule_id:
+            deltas[record.campaign_id, record.second_dose_schedule.date]['second_doses'] += 1
+    _on_commit(deltas)
+
+
+def bookings_cancelled(schedule, records):
+    """Count cancelled records whose first dose was on `schedule`."""
+    second_dates = dict(VaccineSchedule.objects.filter(
+        pk__in={record.second_dose_schedule_id for record in records if record.second_dose_schedule_id}
+    ).values_list('pk', 'date'))
+    today = timezone.localdate()
+    deltas = _new_deltas()
+    campaign_id = schedule.campaign_id
+    for record in records:
+        deltas[campaign_id, today]['cancellations'] += 1
+        deltas[campaign_id, schedule.date]['first_doses'] -= 1
+        if record.second_dose_schedule_id in second_dates:
+            deltas[campaign_id, second_dates[record.second_dose_schedule_id]]['second_doses'] -= 1
+        if record.status == VaccineRecord.MISSED:
+            last_dose = second_dates.get(record.second_dose_schedule_id, schedule.date)
+            deltas[campaign_id, last_dose]['missed'] -= 1
+    _on_commit(deltas)
+
+
+def records_missed(keys):
+    """Count records marked missed, as (campaign_id, last dose date) pairs."""
+    deltas = _new_deltas()
+    for key in keys:
+        deltas[key]['missed'] += 1
+    _on_commit(deltas)
+
+
+def payment_received(payment):
+    deltas = _new_deltas()
+    deltas[payment.campaign_id, timezone.localdate(payment.created_at)]['revenue'] = payment.amount
+    _on_commit(deltas)
+
+
+def rebuild_rollups():
+    """Recompute bookings, doses and revenue for every campaign day. Returns the number of rows."""
+    deltas = _new_deltas()
+    queries = [
+        ('bookings', VaccineRecord.objects.annotate(day=TruncDate('created_at')), Count('id')),
+        ('first_doses', VaccineRecord.objects.annotate(day=F('first_dose_schedule__date')), Count('id')),
+        ('second_doses', VaccineRecord.objects.filter(second_dose_schedule__isnull=False)
+            .annotate(day=F('second_dose_schedule__date')), Count('id')),
+        ('missed', VaccineRecord.objects.filter(status=VaccineRecord.MISSED)
+            .annotate(day=Coalesce('second_dose_schedule__date', 'first_dose_schedule__date')), Count('id')),
+        ('revenue', Payment.objects.filter(payment_status=Payment.SUCCESS, campaign_id__in=VaccineCampaign.objects.values('pk'))
+            .annotate(campaign=F('campaign_id'), day=TruncDate('created_at')), Sum('amount')),
+    ]
+    with transaction.atomic():
+        for field, queryset, total in queries:
+            for campaign_id, day, value in queryset.values('campaign', 'day').order_by().annotate(
+                value=total
+            ).values_list('campaign', 'day', 'value'):
+                deltas[campaign_id, day][field] = value or 0
+
+        for campaign_id, day, n in CampaignDailyStats.objects.filter(cancellations__gt=0).values_list(
+            'campaign_id', 'date', 'cancellations'
+        ):
+            deltas[campaign_id, day]['cancellations'] = n
+
+        CampaignDailyStats.objects.all().delete()
+        CampaignDailyStats.objects.bulk_create([
+            CampaignDailyStats(
+                campaign_id=campaign_id, date=day,
+                **{field: values.get(field, 0) for field in FIELDS}
+            )
+            for (campaign_id, day), values in deltas.items()
+        ], batch_size=1000)
+    return len(deltas)
+
+
+def dashboard(campaigns, start, end):
+    """
+    Analytics for `campaigns` (a VaccineCampaign queryset) from the rollups:
+    all-time totals per campaign and a daily series from `start` to `end`.
+    Three queries, whatever the number of records.
+    """
+    today = timezone.localdate()
+    rows = list(campaigns.order_by('id').values('id', 'name', 'max_participants', 'participant_count'))
+    stats = CampaignDailyStats.objects.filter(campaign_id__in=[row['id'] for row in rows])
+    due = Q(date__lte=today)
+    totals = {
+        row.pop('campaign_id'): row for row in stats.values('campaign_id').order_by().annotate(
+            bookings=Sum('bookings'),
+            cancellations=Sum('cancellations'),
+            missed=Sum('missed'),
+            revenue=Sum('revenue'),
+            first_doses_scheduled=Sum('first_doses'),
+            first_doses_done=Sum('first_doses', filter=due),
+            second_doses_scheduled=Sum('second_doses'),
+            second_doses_done=Sum('second_doses', filter=due),
+        )
+    }
+
+    for row in rows:
+        row.update({field: 0 for field in [
+            'bookings', 'cancellations', 'missed', 'revenue', 'first_doses_scheduled', 'first_doses_done',
+            'second_doses_scheduled', 'second_doses_done',
+        ]})
+        row.update({key: value or 0 for key, value in totals.get(row['id'], {}).items()})
+        row['fill_rate'] = round(row['participant_count'] / row['max_participants'], 4) if row['max_participants'] else None
+        for dose in ['first', 'second']:
+            scheduled = row[f'{dose}_doses_scheduled']
+            row[f'{dose}_dose_completion'] = round(row[f'{dose}_doses_done'] / scheduled, 4) if scheduled else None
+
+    daily = list(
+        stats.filter(date__gte=start, date__lte=end).values('date').order_by('date').annotate(
+            **{field: Sum(field) for field in FIELDS}
+        )
+    )
+    return {'from': start, 'to': end, 'campaigns': rows, 'daily': daily}
@@ -1,9 +1,11 @@
 from rest_framework import serializers
-from .models import VaccineRecord, CampaignReview, Payment
+from .models import VaccineRecord, CampaignReview, CampaignRatingSummary, Payment, WaitlistEntry, BookingRequest
 from campaigns.models import VaccineSchedule, VaccineCampaign
 
 from django.utils import timezone
 from django.db import transaction
+from .bulk import parse_rows, BulkBookingError
+from .waitlist import waitlist_position
 
 class VaccineRecordSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
@@ -58,6 +60,16 @@ class CampaignReviewSerializer(serializers.ModelSerializer):
         return obj.campaign.name
     
     
+class CampaignRatingSummarySerializer(serializers.ModelSerializer):
+    average = serializers.FloatField(read_only=True, allow_null=True)
+    histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = CampaignRatingSummary
+        fields = ['campaign', 'review_count', 'rating_sum', 'average', 'histogram']
+        read_only_fields = fields
+
+
 class PaymentInitiateSerializer(serializers.Serializer):
     payment_id = serializers.IntegerField()
     amount = serializers.DecimalField(max_digits=10, decimal_places=2)
@@ -71,8 +83,67 @@ class PaymentInitiateSerializer(serializers.Serializer):
         except Payment.DoesNotExist:
             raise serializers.ValidationError("Payment not found.")
 
+        if payment.payment_status != Payment.PENDING:
+            raise serializers.ValidationError("This payment is no longer pending; book again to get a new one.")
+
         if str(payment.amount) != str(attrs['amount']):
             raise serializers.ValidationError("Amount mismatch with payment record.")
 
         attrs['payment'] = payment
-        return attrs
\ No newline at end of file
+        return attrs
+
+class BulkBookingSerializer(serializers.Serializer):
+    """
+    Input for POST /api/v1/campaigns/{id}/bookings/import/.
+    Send either a CSV / JSONL `file` (multipart) or a JSON list of `rows`.
+    Each row has `patient` (NID or email) and optionally `schedule_id` or `date`.
+    """
+    MAX_ROWS = 20000
+
+    file = serializers.FileField(required=False)
+    format = serializers.ChoiceField(choices=['csv', 'jsonl'], required=False)
+    rows = serializers.ListField(child=serializers.DictField(), required=False)
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        if ('file' in attrs) == ('rows' in attrs):
+            raise serializers.ValidationError("Provide either a file or rows.")
+        if 'file' in attrs:
+            upload = attrs.pop('file')
+            try:
+                attrs['rows'] = parse_rows(upload, attrs.get('format'), upload.name)
+            except (BulkBookingError, UnicodeDecodeError) as e:
+                raise serializers.ValidationError(str(e))
+        if not attrs['rows']:
+            raise serializers.ValidationError("No rows to import.")
+        if len(attrs['rows']) > self.MAX_ROWS:
+            raise serializers.ValidationError(f"At most {self.MAX_ROWS} rows can be imported at once.")
+        return attrs
+
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    date = serializers.DateField(source='schedule.date', read_only=True)
+    start_time = serializers.TimeField(source='schedule.start_time', read_only=True)
+    end_time = serializers.TimeField(source='schedule.end_time', read_only=True)
+    position = serializers.SerializerMethodField()
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ['id', 'schedule', 'date', 'start_time', 'end_time', 'position', 'created_at']
+
+    def get_position(self, obj):
+        return waitlist_position(obj)
+
+
+class ScheduleCancellationSerializer(serializers.Serializer):
+    """Bookings to cancel on a schedule; every first-dose booking when record_ids is omitted."""
+    record_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+
+
+class BookingRequestSerializer(serializers.ModelSerializer):
+    record = VaccineRecordSerializer(read_only=True)
+
+    class Meta:
+        model = BookingRequest
+        fields = ['ticket', 'status', 'detail', 'campaign', 'schedule', 'record', 'created_at', 'processed_at']
+        read_only_fields = fields
@@ -1,3 +1,400 @@
-from django.test import TestCase
+import threading
+from datetime import time, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.db import IntegrityError, connection
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from campaigns.models import VaccineCampaign, VaccineSchedule
+from users.models import User
+from . import callbacks, queue
+from .fake_gateway import make_server
+from .gateway import get_gateway
+from .holds import create_hold, release_expired_holds, HoldUnavailable
+from .models import BookingRequest, Payment, VaccineRecord, WaitlistEntry
+from .reconcile import reconcile
+from .waitlist import cancel_bookings
 
-# Create your tests here.
+
+def create_user(role, n):
+    return User.objects.create_user(
+        email=f"{role.lower()}{n}@example.com", nid=f"{n:010d}", role=role, password='test'
+    )
+
+
+def create_campaign(doctor, **extra):
+    today = timezone.localdate()
+    fields = {
+        'name': 'Test campaign',
+        'description': 'Campaign used by the booking tests',
+        'vaccine_type': 'Flu',
+        'start_date': today,
+        'end_date': today + timedelta(days=60),
+        'max_participants': 100,
+        'created_by': doctor,
+        'status': VaccineCampaign.ACTIVE,
+    }
+    fields.update(extra)
+    return VaccineCampaign.objects.create(**fields)
+
+
+def create_schedule(campaign, slots, start=time(9), end=time(10), days=1):
+    return VaccineSchedule.objects.create(
+        campaign=campaign,
+        date=timezone.localdate() + timedelta(days=days),
+        start_time=start,
+        end_time=end,
+        available_slots=slots,
+    )
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Many patients booking the same windows at once through the booking endpoint."""
+
+    windows = 2
+    slots = 5
+    patients = 16
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("An in-memory SQLite database cannot take concurrent writers")
+        self.doctor = create_user(User.Role.DOCTOR, 1)
+        self.campaign = create_campaign(self.doctor)
+        self.first_doses = [
+            create_schedule(self.campaign, self.slots, start=time(8 + i), end=time(9 + i))
+            for i in range(self.windows)
+        ]
+        self.users = [create_user(User.Role.PATIENT, 100 + i) for i in range(self.patients)]
+
+    def book_concurrently(self):
+        barrier = threading.Barrier(len(self.users))
+        statuses = []
+
+        def book(patient, schedule):
+            client = APIClient()
+            client.force_authenticate(patient)
+            try:
+                barrier.wait()
+                response = client.post(
+                    f'/api/v1/campaigns/{self.campaign.id}/booking/',
+                    {'first_dose_schedule_id': schedule.id}, format='json'
+                )
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=book, args=(patient, self.first_doses[i % self.windows]))
+            for i, patient in enumerate(self.users)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def second_dose_window(self, schedule):
+        return VaccineSchedule.objects.filter(
+            campaign=self.campaign,
+            date=schedule.date + timedelta(days=self.campaign.dosage_interval_days),
+            start_time=schedule.start_time,
+            end_time=schedule.end_time,
+        )
+
+    def assertNotOversold(self, capacity):
+        duplicates = VaccineSchedule.objects.filter(campaign=self.campaign).values(
+            'date', 'start_time', 'end_time'
+        ).annotate(n=Count('id')).filter(n__gt=1)
+        self.assertFalse(duplicates.exists())
+
+        for schedule in VaccineSchedule.objects.filter(campaign=self.campaign).annotate(
+            firsts=Count('first_dose_bookings', distinct=True),
+            seconds=Count('second_dose_bookings', distinct=True),
+        ):
+            self.assertGreaterEqual(schedule.available_slots, 0)
+            self.assertEqual(
+                schedule.firsts + schedule.seconds + schedule.available_slots,
+                capacity[schedule.pk],
+                f"schedule {schedule.pk}: counter and bookings disagree"
+            )
+
+        records = VaccineRecord.objects.filter(campaign=self.campaign)
+        self.assertFalse(records.filter(second_dose_schedule__isnull=True).exists())
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.participant_count, records.count())
+
+    def test_no_duplicate_windows_and_no_oversold_slots(self):
+        statuses = self.book_concurrently()
+
+        booked = statuses.count(201)
+        self.assertEqual(len(statuses), self.patients)
+        self.assertEqual(booked, VaccineRecord.objects.filter(campaign=self.campaign).count())
+        self.assertLessEqual(booked, self.windows * self.slots)
+        capacity = {schedule.pk: self.slots for schedule in self.first_doses}
+        for schedule in self.first_doses:
+            # The allocator sizes a new second-dose window like its first-dose window
+            window = self.second_dose_window(schedule).get()
+            capacity[window.pk] = self.slots
+        self.assertNotOversold(capacity)
+
+    def test_full_second_dose_window_is_not_oversold(self):
+        capacity = {schedule.pk: self.slots for schedule in self.first_doses}
+        for schedule in self.first_doses:
+            window = VaccineSchedule.objects.create(
+                campaign=self.campaign,
+                date=schedule.date + timedelta(days=self.campaign.dosage_interval_days),
+                start_time=schedule.start_time,
+                end_time=schedule.end_time,
+                available_slots=2,
+            )
+            capacity[window.pk] = 2
+
+        statuses = self.book_concurrently()
+
+        self.assertLessEqual(statuses.count(201), self.windows * 2)
+        self.assertNotOversold(capacity)
+
+
+class ProcessCallbackTests(TestCase):
+    def setUp(self):
+        self.doctor = create_user(User.Role.DOCTOR, 1)
+        self.patient = create_user(User.Role.PATIENT, 2)
+        self.campaign = create_campaign(self.doctor, is_premium=True, premium_price=Decimal('500.00'))
+        self.schedule = create_schedule(self.campaign, 3)
+
+    def test_replayed_success_books_once(self):
+        payment = create_hold(self.patient, self.campaign, self.schedule)
+
+        outcome = callbacks.process_callback(payment.id, callbacks.SUCCESS, 'bank-1')
+        replay = callbacks.process_callback(payment.id, callbacks.SUCCESS, 'bank-1')
+
+        self.assertEqual(outcome, callbacks.BOOKED)
+        self.assertEqual(replay, callbacks.DUPLICATE)
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_status, Payment.SUCCESS)
+        self.assertEqual(VaccineRecord.objects.filter(patient=self.patient).count(), 1)
+        self.assertEqual(payment.record, VaccineRecord.objects.get(patient=self.patient))
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_slots, 2)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.participant_count, 1)
+
+    def test_fail_after_success_changes_nothing(self):
+        payment = create_hold(self.patient, self.campaign, self.schedule)
+        callbacks.process_callback(payment.id, callbacks.SUCCESS, 'bank-1')
+
+        self.assertEqual(callbacks.process_callback(payment.id, callbacks.FAIL), callbacks.DUPLICATE)
+        payment.refresh_from_db()
+        self.assertEqual(payment.payment_status, Payment.SUCCESS)
+        self.assertTrue(VaccineRecord.objects.filter(patient=self.patient).exists())
+
+    def test_transaction_id_settles_one_payment(self):
+        other = create_user(User.Role.PATIENT, 3)
+        first = create_hold(self.patient, self.campaign, self.schedule)
+        second = create_hold(other, self.campaign, self.schedule)
+        callbacks.process_callback(first.id, callbacks.SUCCESS, 'bank-1')
+
+        outcome = callbacks.process_callback(second.id, callbacks.SUCCESS, 'bank-1')
+
+        self.assertEqual(outcome, callbacks.DUPLICATE)
+        second.refresh_from_db()
+        self.assertEqual(second.payment_status, Payment.PENDING)
+        self.assertFalse(VaccineRecord.objects.filter(patient=other).exists())
+
+    def test_cancel_releases_the_hold(self):
+        payment = create_hold(self.patient, self.campaign, self.schedule)
+
+        self.assertEqual(callbacks.process_callback(payment.id, callbacks.CANCEL), callbacks.CANCELLED)
+        self.assertEqual(callbacks.process_callback(payment.id, callbacks.CANCEL), callbacks.DUPLICATE)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_slots, 3)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.participant_count, 0)
+        second = VaccineSchedule.objects.get(pk=payment.second_dose_schedule_id)
+        self.assertEqual(second.available_slots, 3)
+
+    def test_paid_hold_books_when_the_second_dose_window_fills(self):
+        payment = create_hold(self.patient, self.campaign, self.schedule)
+        second = VaccineSchedule.objects.get(pk=payment.second_dose_schedule_id)
+        self.assertEqual(second.available_slots, 2)
+        VaccineSchedule.objects.filter(pk=second.pk).update(available_slots=0)
+
+        outcome = callbacks.process_callback(payment.id, callbacks.SUCCESS, 'bank-1')
+
+        self.assertEqual(outcome, callbacks.BOOKED)
+        record = VaccineRecord.objects.get(patient=self.patient)
+        self.assertEqual(record.second_dose_schedule_id, second.pk)
+        second.refresh_from_db()
+        self.assertEqual(second.available_slots, 0)
+
+    def test_full_second_dose_window_refuses_the_hold(self):
+        payment = create_hold(self.patient, self.campaign, self.schedule)
+        VaccineSchedule.objects.filter(pk=payment.second_dose_schedule_id).update(available_slots=0)
+        other = create_user(User.Role.PATIENT, 3)
+
+        with self.assertRaises(HoldUnavailable):
+            create_hold(other, self.campaign, self.schedule)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_slots, 2)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.participant_count, 1)
+
+    def test_expired_hold_releases_both_doses(self):
+        payment = create_hold(self.patient, self.campaign, self.schedule)
+        Payment.objects.filter(pk=payment.pk).update(hold_expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(release_expired_holds(), 1)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_slots, 3)
+        second = VaccineSchedule.objects.get(pk=payment.second_dose_schedule_id)
+        self.assertEqual(second.available_slots, 3)
+
+
+class CancelBookingsTests(TestCase):
+    def setUp(self):
+        self.doctor = create_user(User.Role.DOCTOR, 1)
+        self.patient = create_user(User.Role.PATIENT, 2)
+        self.waiting = create_user(User.Role.PATIENT, 3)
+        self.campaign = create_campaign(self.doctor)
+        self.schedule = create_schedule(self.campaign, 1)
+        client = APIClient()
+        client.force_authenticate(self.patient)
+        response = client.post(
+            f'/api/v1/campaigns/{self.campaign.id}/booking/',
+            {'first_dose_schedule_id': self.schedule.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.record = VaccineRecord.objects.get(patient=self.patient)
+        self.second_dose = self.record.second_dose_schedule
+
+    def test_freed_slot_goes_to_the_waitlist(self):
+        WaitlistEntry.objects.create(schedule=self.schedule, patient=self.waiting)
+
+        promoted = cancel_bookings(self.schedule, [self.record])
+
+        self.assertEqual([record.patient_id for record in promoted], [self.waiting.id])
+        self.assertFalse(VaccineRecord.objects.filter(patient=self.patient).exists())
+        record = VaccineRecord.objects.get(patient=self.waiting)
+        self.assertEqual(record.first_dose_schedule, self.schedule)
+        self.assertEqual(record.second_dose_schedule, self.second_dose)
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_slots, 0)
+        self.second_dose.refresh_from_db()
+        self.assertEqual(self.second_dose.available_slots, 0)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.participant_count, 1)
+
+    def test_waiting_patient_who_booked_meanwhile_is_skipped(self):
+        WaitlistEntry.objects.create(schedule=self.schedule, patient=self.waiting)
+        other = create_schedule(self.campaign, 1, start=time(11), end=time(12))
+        VaccineRecord.objects.create(
+            patient=self.waiting, campaign=self.campaign, first_dose_schedule=other,
+            status=VaccineRecord.SCHEDULED
+        )
+
+        promoted = cancel_bookings(self.schedule, [self.record])
+
+        self.assertEqual(promoted, [])
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_slots, 1)
+
+    def test_slot_is_released_without_a_waitlist(self):
+        promoted = cancel_bookings(self.schedule, [self.record])
+
+        self.assertEqual(promoted, [])
+        self.assertFalse(VaccineRecord.objects.exists())
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available_slots, 1)
+        self.second_dose.refresh_from_db()
+        self.assertEqual(self.second_dose.available_slots, 1)
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.participant_count, 0)
+
+
+class ProcessBatchTests(TestCase):
+    def setUp(self):
+        self.doctor = create_user(User.Role.DOCTOR, 1)
+        self.patient = create_user(User.Role.PATIENT, 2)
+        self.broken = create_campaign(self.doctor, name='Broken campaign')
+        self.campaign = create_campaign(self.doctor)
+        queue.enqueue(self.patient, self.broken, create_schedule(self.broken, 5))
+        queue.enqueue(self.patient, self.campaign, create_schedule(self.campaign, 5))
+
+    def test_unexpected_error_fails_only_its_campaign(self):
+        book_entries = queue.book_entries
+
+        def flaky(campaign, entries):
+            if campaign.pk == self.broken.pk:
+                raise IntegrityError("duplicate key value")
+            return book_entries(campaign, entries)
+
+        with mock.patch.object(queue, 'book_entries', side_effect=flaky):
+            self.assertEqual(queue.process_batch(), (1, 1))
+
+        failed = BookingRequest.objects.get(campaign=self.broken)
+        self.assertEqual(failed.status, BookingRequest.FAILED)
+        self.assertIn("duplicate key value", failed.detail)
+        self.assertEqual(BookingRequest.objects.get(campaign=self.campaign).status, BookingRequest.BOOKED)
+        self.assertEqual(list(VaccineRecord.objects.values_list('campaign_id', flat=True)), [self.campaign.pk])
+        self.assertEqual(queue.process_batch(), (0, 0))
+
+
+class ReconcileTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = make_server(paid_rate=0)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.settings = override_settings(PAYMENT_GATEWAY_URL=f"http://127.0.0.1:{cls.server.server_address[1]}")
+        cls.settings.enable()
+        get_gateway.cache_clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings.disable()
+        get_gateway.cache_clear()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.doctor = create_user(User.Role.DOCTOR, 1)
+        self.patient = create_user(User.Role.PATIENT, 2)
+        self.campaign = create_campaign(self.doctor, is_premium=True, premium_price=Decimal('500.00'))
+        self.schedule = create_schedule(self.campaign, 3)
+        self.payment = create_hold(self.patient, self.campaign, self.schedule)
+
+    def test_paid_payment_is_booked(self):
+        self.server.pay(f"txn_{self.payment.id}", self.payment.amount)
+
+        stats = reconcile(older_than=timedelta(0))
+
+        self.assertEqual(stats['booked'], 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_status, Payment.SUCCESS)
+        self.assertIsNotNone(self.payment.record)
+
+    def test_payment_for_another_amount_stays_pending(self):
+        self.server.pay(f"txn_{self.payment.id}", self.payment.amount - 1)
+
+        stats = reconcile(older_than=timedelta(0))
+
+        self.assertEqual((stats['booked'], stats['mismatched']), (0, 1))
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_status, Payment.PENDING)
+        self.assertFalse(VaccineRecord.objects.exists())
+
+    def test_payment_in_another_currency_stays_pending(self):
+        tran_id = f"txn_{self.payment.id}"
+        self.server.pay(tran_id, self.payment.amount)
+        self.server.payments[tran_id]['currency'] = 'USD'
+
+        stats = reconcile(older_than=timedelta(0))
+
+        self.assertEqual(stats['mismatched'], 1)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.payment_status, Payment.PENDING)
@@ -1,23 +1,36 @@
 from rest_framework import status
-from django.shortcuts import redirect
+from django.shortcuts import redirect, get_object_or_404
+from django.http import StreamingHttpResponse
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from .models import VaccineRecord, CampaignReview,Payment
-from .serializers import VaccineRecordSerializer, CampaignReviewSerializer, PaymentInitiateSerializer
+from .models import VaccineRecord, CampaignReview, CampaignRatingSummary, BookingRequest
+from .serializers import VaccineRecordSerializer, CampaignReviewSerializer, PaymentInitiateSerializer, BookingRequestSerializer, CampaignRatingSummarySerializer
 from users.permissions import IsPatient, IsDoctor, IsPatientOrReadOnly
-from campaigns.models import VaccineSchedule, VaccineCampaign
+from campaigns.models import VaccineCampaign
 from rest_framework.decorators import action
-from django.db.models import F
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from django.utils import timezone
-from campaigns.serializers import VaccineScheduleSerializer
 from rest_framework.viewsets import ReadOnlyModelViewSet
-from rest_framework.decorators import api_view
-from sslcommerz_lib import SSLCOMMERZ 
-from decouple import config
+from rest_framework.decorators import api_view, permission_classes
 from django.conf import settings as main_settings
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import ValidationError, NotFound
+import uuid
+from campaigns.pagination import DefaultPagination, KeysetPagination
+from .waitlist import cancel_bookings
+from .idempotency import idempotent
+from .export import EXPORT_CONTENT_TYPES, stream_export
+from .gateway import create_session, GatewayError, CURRENCY
+from .ratings import apply_review_change, summary_for, RATINGS
+from .filters import CampaignReviewFilter
+from .callbacks import (
+    process_callback, payment_id_from_tran_id, verified_transaction, verified_unpaid, SUCCESS, FAIL, CANCEL,
+    FAILED, CANCELLED, NOT_FOUND, CAMPAIGN_FULL, SLOT_FULL, SECOND_DOSE_FULL, SCHEDULE_GONE, UNVERIFIED
+)
 
 class VaccineBookingViewSet(ReadOnlyModelViewSet):
     """
@@ -25,16 +38,17 @@ class VaccineBookingViewSet(ReadOnlyModelViewSet):
     All booking creation is handled inside VaccineCampaignViewSet (campaigns/{id}/booking/).
     """
     queryset = VaccineRecord.objects.select_related(
-        'patient', 'campaign', 'first_dose_schedule', 'first_dose_schedule__campaign','payment',
-        'second_dose_schedule', 'second_dose_schedule__campaign'
-    ).prefetch_related('campaign__schedules')
+        'patient', 'campaign', 'first_dose_schedule', 'payment', 'second_dose_schedule'
+    ).order_by('-id')
 
     serializer_class = VaccineRecordSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = DefaultPagination
+    keyset_ordering = ('-id',)
 
     def get_permissions(self):
         # Patients see their own bookings; doctors can see all
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'export']:
             return [IsAuthenticated(), (IsPatient | IsDoctor)()]
         return super().get_permissions()
 
@@ -47,24 +61,73 @@ class VaccineBookingViewSet(ReadOnlyModelViewSet):
             qs = qs.filter(patient=user)
         return qs
 
-    def list(self, request, *args, **kwargs):
+    @swagger_auto_schema(
+        operation_summary="Export Bookings",
+        operation_description="Stream every visible booking as NDJSON (default) or CSV with ?output=csv. "
+                              "Filter with ?campaign=<id> and ?status=SCHEDULED|COMPLETED|MISSED.",
+        responses={200: 'application/x-ndjson or text/csv stream'}
+    )
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_CONTENT_TYPES:
+            return Response({'detail': "output must be 'ndjson' or 'csv'."}, status=status.HTTP_400_BAD_REQUEST)
+
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({
-            "count": queryset.count(),
-            "results": serializer.data
-        })
-    
+        campaign_id = request.query_params.get('campaign')
+        if campaign_id:
+            if not campaign_id.isdigit():
+                return Response({'detail': "campaign must be an id."}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = queryset.filter(campaign_id=campaign_id)
+        record_status = request.query_params.get('status')
+        if record_status:
+            queryset = queryset.filter(status=record_status)
+
+        response = StreamingHttpResponse(
+            stream_export(queryset, output),
+            content_type=EXPORT_CONTENT_TYPES[output]
+        )
+        timestamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+        response['Content-Disposition'] = f'attachment; filename="bookings-{timestamp}.{output}"'
+        return response
+
+    @swagger_auto_schema(
+        operation_summary="Queued Booking Status",
+        operation_description="Status of a booking accepted with ?mode=queued: PENDING, BOOKED (with the record) or FAILED (with the reason)",
+        responses={200: BookingRequestSerializer()}
+    )
+    @action(detail=False, methods=['get'], url_path=r'requests/(?P<ticket>[0-9a-fA-F-]{32,36})',
+            url_name='booking-request', permission_classes=[IsAuthenticated, IsPatient])
+    def booking_request(self, request, ticket=None):
+        try:
+            ticket = uuid.UUID(ticket)
+        except ValueError:
+            raise NotFound()
+        booking_request = get_object_or_404(
+            BookingRequest.objects.select_related(
+                'record', 'record__patient', 'record__campaign',
+                'record__first_dose_schedule', 'record__second_dose_schedule'
+            ),
+            ticket=ticket,
+            patient=request.user
+        )
+        return Response(BookingRequestSerializer(booking_request).data)
+
     @action(detail=True, methods=['delete'], permission_classes=[IsAuthenticated, IsPatient])
     def delete(self, request, pk=None):
         record = self.get_object()
-        record.delete()
+        # Frees the slot for the next patient on the schedule's waitlist
+        cancel_bookings(record.first_dose_schedule, [record])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class CampaignReviewViewSet(ModelViewSet):
     serializer_class = CampaignReviewSerializer
     permission_classes = [IsPatientOrReadOnly]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = CampaignReviewFilter
 
     def get_queryset(self):
         queryset = CampaignReview.objects.select_related('patient', 'campaign')
@@ -80,28 +143,76 @@ class CampaignReviewViewSet(ModelViewSet):
         if campaign_pk:
             if not VaccineRecord.objects.filter(patient=user, campaign_id=campaign_pk).exists():
                 raise ValidationError("You must book this vaccine to review it.")
-            serializer.save(patient=user, campaign_id=campaign_pk)
+            campaign_id = campaign_pk
         else:
             campaign_id = self.request.data.get('campaign')
             if not campaign_id:
                 raise ValidationError("campaign field is required.")
             if not VaccineRecord.objects.filter(patient=user, campaign_id=campaign_id).exists():
                 raise ValidationError("You must book this vaccine to review it.")
-            serializer.save(patient=user, campaign_id=campaign_id)
+        with transaction.atomic():
+            review = serializer.save(patient=user, campaign_id=campaign_id)
+            apply_review_change(review.campaign_id, new_rating=review.rating)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            old_rating = serializer.instance.rating
+            review = serializer.save()
+            apply_review_change(review.campaign_id, old_rating, review.rating)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            apply_review_change(instance.campaign_id, old_rating=instance.rating)
+
+    @swagger_auto_schema(
+        operation_summary="Campaign Rating Summary",
+        operation_description=(
+            "Review count, rating sum, average and 1-5 histogram of a campaign "
+            "(nested URL or ?campaign_id=), read from the maintained summary"
+        ),
+        responses={200: CampaignRatingSummarySerializer()}
+    )
+    @action(detail=False, methods=['get'], url_path='summary')
+    def summary(self, request, campaigns_pk=None):
+        campaign_id = campaigns_pk or request.query_params.get('campaign_id')
+        if not campaign_id or not str(campaign_id).isdigit():
+            raise ValidationError("campaign_id is required.")
+        if not VaccineCampaign.objects.filter(pk=campaign_id).exists():
+            raise NotFound("Campaign not found.")
+        return Response(CampaignRatingSummarySerializer(summary_for(campaign_id)).data)
+
+    def known_count(self):
+        """
+        The total from the rating summaries when only the campaign and an
+        exact rating are filtered on; other filters need ?count=exact.
+        """
+        params = self.request.query_params
+        if 'min_rating' in params or 'since' in params:
+            return None
+        rating = params.get('rating')
+        if rating is not None and rating not in {str(r) for r in RATINGS}:
+            return None
+        field = f'rating_{rating}' if rating else 'review_count'
+        summaries = CampaignRatingSummary.objects.all()
+        campaign_id = self.kwargs.get('campaigns_pk') or params.get('campaign_id')
+        if campaign_id:
+            if not str(campaign_id).isdigit():
+                return None
+            summaries = summaries.filter(campaign_id=campaign_id)
+        return summaries.aggregate(total=Coalesce(Sum(field), 0))['total']
 
     @swagger_auto_schema(
         operation_summary="List Campaign Reviews",
-        operation_description="Retrieve campaign reviews with total count, optionally filtered by campaign_id",
-        responses={200: '{"count": 10, "results": [...]}'}
+        operation_description=(
+            "Newest-first cursor pages of reviews, filtered by campaign_id, rating, min_rating "
+            "or since (ISO date-time). The total comes from the rating summaries when only "
+            "campaign and rating are filtered; otherwise use ?count=exact"
+        ),
+        responses={200: CampaignReviewSerializer(many=True)}
     )
     def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
-        queryset = self.filter_queryset(self.get_queryset())
-        response.data = {
-            'count': queryset.count(),
-            'results': response.data
-        }
-        return response
+        return super().list(request, *args, **kwargs)
 
     @swagger_auto_schema(
         operation_summary="Retrieve a Campaign Review",
@@ -148,6 +259,7 @@ class CampaignReviewViewSet(ModelViewSet):
 
 
 @api_view(['POST'])
+@idempotent
 def initiate_payment(request):
     print(request.data)
     serializer = PaymentInitiateSerializer(data=request.data)
@@ -160,11 +272,9 @@ def initiate_payment(request):
     amount = serializer.validated_data['amount']
 
 
-    settings = { 'store_id': config('Store_ID'), 'store_pass': config('store_pass'), 'issandbox': True }
-    sslcz = SSLCOMMERZ(settings)
     post_body = {}
     post_body['total_amount'] = amount
-    post_body['currency'] = "BDT"
+    post_body['currency'] = CURRENCY
     post_body['tran_id'] = f"txn_{payment.id}"
     post_body['success_url'] = f"{main_settings.BACKEND_URL}/api/v1/payment/success/"
     post_body['fail_url'] = f"{main_settings.BACKEND_URL}/api/v1/payment/fail/"
@@ -183,52 +293,51 @@ def initiate_payment(request):
     post_body['product_category'] = "Vaccine"
     post_body['product_profile'] = "general"
 
-    response = sslcz.createSession(post_body) # API response
+    try:
+        response = create_session(post_body) # API response
+    except GatewayError:
+        # Not stored for Idempotency-Key replays, so the client can retry
+        return Response({"error": "Payment gateway unavailable"}, status=status.HTTP_502_BAD_GATEWAY)
     print("SSLCommerz response:", response)
     if response.get("status") == 'SUCCESS':
         return Response({"payment_url": response['GatewayPageURL']})
     return Response({"error": "Payment initiation failed"}, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(["POST"])
-def payment_success(request):
-    payemnt_id = request.data.get("tran_id").split('_')[1]
-    payment = Payment.objects.get(id=payemnt_id)
-    payment.payment_status = Payment.SUCCESS
-    payment.payment_reference = request.data.get("bank_tran_id")
-    payment.save()
-
-    # Create VaccineRecord after payment
-    from campaigns.models import VaccineCampaign, VaccineSchedule
-    campaign = VaccineCampaign.objects.get(id=payment.campaign_id)
-    schedule = VaccineSchedule.objects.get(id=payment.schedule_id)
-
-    record = VaccineRecord.objects.create(
-        patient=payment.patient,
-        campaign=campaign,
-        first_dose_schedule=schedule,
-        status=VaccineRecord.SCHEDULED
-    )
+# The gateway posts these callbacks from the patient's browser without a JWT,
+# so their contents are checked with the gateway before anything is settled.
+# A callback the gateway cannot confirm yet is left to reconcile_payments.
+def _callback_redirect(outcome):
+    if outcome in (CAMPAIGN_FULL, SLOT_FULL, SECOND_DOSE_FULL, SCHEDULE_GONE, UNVERIFIED):
+        return redirect(f"{main_settings.FRONTEND_URL}/dashboard/user?booking={outcome}")
+    return redirect(f"{main_settings.FRONTEND_URL}/dashboard/user")
 
-    # Link payment to the created record
-    payment.record = record
-    payment.save()
 
-    # Reduce slot count
-    schedule.available_slots = F('available_slots') - 1
-    schedule.save()
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def payment_success(request):
+    payment_id = payment_id_from_tran_id(request.data.get("tran_id"))
+    if payment_id is None:
+        return _callback_redirect(NOT_FOUND)
+    transaction_id = verified_transaction(payment_id, request.data.get("val_id"))
+    if transaction_id is None:
+        return _callback_redirect(UNVERIFIED)
+    return _callback_redirect(process_callback(payment_id, SUCCESS, transaction_id))
 
-    return redirect(f"{main_settings.FRONTEND_URL}/dashboard/user")
 
 @api_view(['POST'])
+@permission_classes([AllowAny])
 def payment_cancel(request):
-    return redirect(f"{main_settings.FRONTEND_URL}/dashboard/user")
+    payment_id = payment_id_from_tran_id(request.data.get("tran_id"))
+    if payment_id is not None and verified_unpaid(payment_id):
+        process_callback(payment_id, CANCEL)
+    return _callback_redirect(CANCELLED)
 
 
 @api_view(['POST'])
+@permission_classes([AllowAny])
 def payment_fail(request):
-    tran_id = request.data.get("tran_id")
-    if tran_id and tran_id.startswith("txn_"):
-        payment_id = tran_id.split('_')[1]
-        Payment.objects.filter(id=payment_id).update(payment_status=Payment.FAILED)
-    return redirect(f"{main_settings.FRONTEND_URL}/dashboard/user")
\ No newline at end of file
+    payment_id = payment_id_from_tran_id(request.data.get("tran_id"))
+    if payment_id is not None and verified_unpaid(payment_id):
+        process_callback(payment_id, FAIL)
+    return _callback_redirect(FAILED)
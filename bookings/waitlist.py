@@ -0,0 +1,96 @@
+"""
+Per-schedule waitlists.
+
+Cancelling a booking hands its first-dose slot straight to the oldest
+waiting patient in the same transaction, so the slot is never visible as
+free in between. The next entries are read through the
+(schedule, id) index with LIMIT, so promotion costs the same however long
+the waitlist is. Entries locked by a concurrent cancellation are skipped
+(SKIP LOCKED where the database supports it).
+
+Premium campaigns are not waitlisted: a promoted patient would have to pay
+before the booking exists.
+"""
+from collections import Counter
+from django.db import transaction
+from campaigns.inventory import release_slot, release_participant
+from .allocation import allocate_second_doses, SecondDoseUnavailable
+from .models import VaccineRecord, WaitlistEntry
+from . import rollups
+
+
+def waitlist_position(entry):
+    return WaitlistEntry.objects.filter(schedule_id=entry.schedule_id, id__lte=entry.id).count()
+
+
+def promote(schedule, count):
+    """
+    Book up to `count` waiting patients into `schedule`, oldest first, using
+    slots the caller has already freed. Entries of patients who booked the
+    campaign some other way in the meantime are dropped. Returns the new
+    records; patients stay on the waitlist if their second dose cannot be
+    reserved.
+    """
+    if count <= 0 or schedule.campaign.is_premium:
+        return []
+
+    promoted = []
+    try:
+        with transaction.atomic():
+            while len(promoted) < count:
+                entries = list(
+                    WaitlistEntry.objects.select_for_update(skip_locked=True)
+                    .filter(schedule=schedule)
+                    .order_by('id')[:count - len(promoted)]
+                )
+                if not entries:
+                    break
+                booked = set(VaccineRecord.objects.filter(
+                    campaign_id=schedule.campaign_id,
+                    patient_id__in=[entry.patient_id for entry in entries]
+                ).values_list('patient_id', flat=True))
+                WaitlistEntry.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+                for entry in entries:
+                    if entry.patient_id in booked:
+                        continue
+                    promoted.append(VaccineRecord(
+                        patient_id=entry.patient_id,
+                        campaign=schedule.campaign,
+                        first_dose_schedule=schedule,
+                        status=VaccineRecord.SCHEDULED
+                    ))
+            if promoted:
+                allocate_second_doses(promoted)
+                VaccineRecord.objects.bulk_create(promoted)
+                rollups.bookings_made(promoted)
+    except SecondDoseUnavailable:
+        return []
+    return promoted
+
+
+def cancel_bookings(schedule, records):
+    """
+    Cancel bookings whose first dose is on `schedule` and give the freed
+    slots to its waitlist. Second-dose slots are returned, and slots and
+    participant places nobody was waiting for are released, all in one
+    transaction. Returns the promoted records.
+    """
+    records = list(records)
+    if not records:
+        return []
+
+    with transaction.atomic():
+        second_doses = Counter(
+            record.second_dose_schedule_id for record in records if record.second_dose_schedule_id
+        )
+        VaccineRecord.objects.filter(pk__in=[record.pk for record in records]).delete()
+        rollups.bookings_cancelled(schedule, records)
+        for schedule_id, count in second_doses.items():
+            release_slot(schedule_id, count)
+
+        promoted = promote(schedule, len(records))
+        freed = len(records) - len(promoted)
+        if freed:
+            release_slot(schedule.pk, freed)
+            release_participant(schedule.campaign_id, freed)
+    return promoted
@@ -0,0 +1,140 @@
+"""
+Per-campaign cache for GET /campaigns/{id}/booking/.
+
+A campaign's future schedules are cached as one list, while each schedule's
+slot count lives under its own key. Bookings and releases adjust those
+counters in place with incr/decr instead of throwing the list away, so a
+busy campaign keeps serving from the cache while registration is open.
+Rebuilding the list only adds counters that are missing, so a rebuild never
+overwrites a live counter with a database read that bookings committed
+after.
+
+A booking that commits while a counter is being rebuilt can find it missing,
+after the rebuild read the database but before it stored the count. Its
+adjustment would be lost, and the stale count would live until the TTL. So
+an adjustment that finds no counter bumps the schedule's lost-adjustment
+mark. A rebuild reads the marks before it reads the slot counts and checks
+them again after storing the counters. Any counter whose mark moved is
+deleted again, and the next read rebuilds it. Schedule edits invalidate the campaign's list and the counters of its
+listed and edited schedules.
+
+The backend is the `AVAILABILITY_CACHE` alias in CACHES: local memory by
+default, or any shared backend (Redis, Memcached, database) in production.
+The hit/miss counters are kept in the same cache, so reading them from
+another process (availability_cache_stats) needs a shared backend.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from .models import VaccineSchedule
+
+LIST_KEY = 'availability:campaign:{}'
+SLOTS_KEY = 'availability:slots:{}'
+LOST_KEY = 'availability:lost:{}'
+HITS_KEY = 'availability:stats:hits'
+MISSES_KEY = 'availability:stats:misses'
+
+
+def get_cache():
+    return caches[settings.AVAILABILITY_CACHE]
+
+
+def _count(cache, key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_availability(campaign_id, build):
+    """
+    Return the bookable schedules of a campaign and whether they came from
+    the cache. `build` returns the serialized future schedules, including
+    full ones, and is only called on a miss.
+    """
+    cache = get_cache()
+    today = timezone.now().date().isoformat()
+
+    rows = cache.get(LIST_KEY.format(campaign_id))
+    if rows is not None:
+        keys = [SLOTS_KEY.format(row['id']) for row in rows]
+        slots = cache.get_many(keys)
+        if len(slots) == len(keys):
+            _count(cache, HITS_KEY)
+            return [
+                {**row, 'available_slots': slots[key]}
+                for row, key in zip(rows, keys)
+                if row['date'] >= today and slots[key] > 0
+            ], True
+
+    _count(cache, MISSES_KEY)
+    data = [dict(row) for row in build()]
+    keys = {row['id']: SLOTS_KEY.format(row['id']) for row in data}
+    lost_keys = {row['id']: LOST_KEY.format(row['id']) for row in data}
+
+    # Marks first, then the counts: a change these counts miss either finds
+    # the counter added below or moves its mark
+    lost = cache.get_many(list(lost_keys.values()))
+    fresh = dict(VaccineSchedule.objects.filter(pk__in=keys).values_list('pk', 'available_slots'))
+    for row in data:
+        row['available_slots'] = fresh.get(row['id'], row['available_slots'])
+        # Counters kept up to date by adjust_slots win over this read
+        cache.add(keys[row['id']], row['available_slots'])
+    moved = cache.get_many(list(lost_keys.values()))
+    stale = [keys[pk] for pk, key in lost_keys.items() if lost.get(key) != moved.get(key)]
+    if stale:
+        cache.delete_many(stale)
+
+    slots = cache.get_many([key for key in keys.values() if key not in stale])
+    for row in data:
+        row['available_slots'] = slots.get(keys[row['id']], row['available_slots'])
+    cache.set(LIST_KEY.format(campaign_id), [
+        {k: v for k, v in row.items() if k != 'available_slots'} for row in data
+    ])
+    return [row for row in data if row['available_slots'] > 0], False
+
+
+def adjust_slots(schedule_id, delta):
+    """Apply a slot change to a cached counter, if the schedule is cached."""
+    cache = get_cache()
+    try:
+        cache.incr(SLOTS_KEY.format(schedule_id), delta)
+    except ValueError:
+        # Not cached; the next read rebuilds it from the database. A rebuild
+        # in flight may store a count read before this change, so mark it
+        key = LOST_KEY.format(schedule_id)
+        cache.add(key, 0)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+def invalidate_campaign(campaign_id, schedule_ids=()):
+    """
+    Drop a campaign's list and the counters of its listed schedules and of
+    `schedule_ids` (schedules edited outside the slot claims).
+    """
+    cache = get_cache()
+    key = LIST_KEY.format(campaign_id)
+    rows = cache.get(key) or []
+    ids = {row['id'] for row in rows} | set(schedule_ids)
+    cache.delete_many([key] + [SLOTS_KEY.format(pk) for pk in ids])
+
+
+def get_stats():
+    cache = get_cache()
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counts.get(HITS_KEY, 0)
+    misses = counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,219 @@
+"""
+Geohash helpers for the nearby-campaign search.
+
+Campaign coordinates are stored with a geohash of GEOHASH_PRECISION
+characters. A radius query covers the circle's bounding box with geohash
+cells and turns each cell into an index range scan
+(geohash >= cell AND geohash < next cell), so no spatial extension is
+needed on PostgreSQL or SQLite. Both bounds are made of BASE32 characters
+only, which every collation orders alike (digits, then letters), so the
+ranges hold under a locale collation such as en_US.UTF-8 as well as
+bytewise.
+"""
+import math
+from django.db.models import ExpressionWrapper, F, FloatField, Q
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+MAX_COVER_CELLS = 32
+INITIAL_SEARCH_RADIUS_KM = 5.0
+MAX_SEARCH_RADIUS_KM = 20038.0
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    longitude = ((longitude + 180.0) % 360.0) - 180.0
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """Height and width of a geohash cell in degrees."""
+    total_bits = 5 * precision
+    lat_bits = total_bits // 2
+    lng_bits = total_bits - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    The smallest latitude/longitude box holding the circle on the sphere.
+    Its longitude half-width is the circle's widest point,
+    asin(sin(radius) / cos(latitude)), which lies poleward of the centre; a
+    circle reaching over a pole spans every longitude.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    d_lat = math.degrees(angle)
+    min_lat, max_lat = latitude - d_lat, latitude + d_lat
+    if min_lat <= -90.0 or max_lat >= 90.0 or angle >= math.pi / 2:
+        return max(-90.0, min_lat), min(90.0, max_lat), longitude - 180.0, longitude + 180.0
+    ratio = math.sin(angle) / math.cos(math.radians(latitude))
+    d_lng = 180.0 if ratio >= 1.0 else math.degrees(math.asin(ratio))
+    return min_lat, max_lat, longitude - d_lng, longitude + d_lng
+
+
+def min_cos(min_lat, max_lat):
+    """The smallest cos(latitude) over [min_lat, max_lat]: at the edge nearest a pole."""
+    return math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+
+
+def sinc_half(span):
+    """sin(span / 2) / (span / 2) for a span in degrees (at most 360); shrinks as the span grows."""
+    half = math.radians(min(span, 360.0)) / 2
+    return math.sin(half) / half if half else 1.0
+
+
+def cover(latitude, longitude, radius_km, max_cells=MAX_COVER_CELLS):
+    """
+    Return the geohash prefixes covering a circle's bounding box, using the
+    finest precision that needs at most `max_cells` cells.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(max_lat / height) - math.floor(min_lat / height) + 1
+        cols = math.floor(max_lng / width) - math.floor(min_lng / width) + 1
+        if rows * cols > max_cells and precision > 1:
+            continue
+        cells = set()
+        for row in range(rows):
+            lat = min(max_lat, (math.floor(min_lat / height) + row + 0.5) * height)
+            for col in range(cols):
+                lng = (math.floor(min_lng / width) + col + 0.5) * width
+                cells.add(encode(max(-90.0, lat), lng, precision))
+        return sorted(cells)
+    return ['']
+
+
+def prefix_end(cell):
+    """
+    The first geohash after every geohash starting with `cell`: the next
+    prefix of the same or shorter length ('wh0b' -> 'wh0c', 'wh0z' -> 'wh1'),
+    or None when nothing sorts after the prefix ('zz').
+    """
+    cell = cell.rstrip(BASE32[-1])
+    if not cell:
+        return None
+    return cell[:-1] + BASE32[BASE32.index(cell[-1]) + 1]
+
+
+def prefix_range(cell):
+    """Q matching geohashes that start with `cell`, as one index range."""
+    end = prefix_end(cell)
+    if end is None:
+        return Q(geohash__gte=cell) if cell else Q(geohash__isnull=False)
+    return Q(geohash__gte=cell, geohash__lt=end)
+
+
+def within_radius(queryset, latitude, longitude, radius_km, limit):
+    """
+    Return up to `limit` (distance_km, pk) pairs within `radius_km`, nearest
+    first.
+
+    The geohash cells narrow the scan to an index range; inside them the
+    database orders by an equirectangular distance and applies the limit, and
+    only those rows get an exact haversine check.
+
+    The equirectangular distance is scaled to a lower bound of the true
+    distance over the whole box: longitude degrees use the smallest cos
+    over the box's latitudes, and the sine terms of the haversine are bounded
+    by the box's spans. So no row haversine keeps is filtered out, and rows
+    past the limit are fetched again when their lower bound could still beat
+    the furthest of the first `limit`.
+    """
+    ranges = Q()
+    for cell in cover(latitude, longitude, radius_km):
+        ranges |= prefix_range(cell)
+
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    rows = queryset.filter(ranges, latitude__range=(min_lat, max_lat))
+    if min_lng < -180.0 or max_lng > 180.0:
+        # The box crosses the antimeridian (or a pole), where longitude
+        # differences do not measure distance: check every row in the cells
+        rows = rows.values_list('pk', 'latitude', 'longitude')
+        return _closest(latitude, longitude, rows, radius_km, limit)
+
+    lng_scale = min_cos(min_lat, max_lat)
+    # Lower bound: degrees of arc >= shrink * sqrt(approx)
+    shrink = min(sinc_half(max(latitude - min_lat, max_lat - latitude)), sinc_half(max_lng - longitude))
+    d_lat = F('latitude') - latitude
+    d_lng = (F('longitude') - longitude) * lng_scale
+    approx = ExpressionWrapper(d_lat * d_lat + d_lng * d_lng, output_field=FloatField())
+
+    def bound(distance_km):
+        return (math.degrees(distance_km / EARTH_RADIUS_KM) / shrink) ** 2
+
+    candidates = rows.filter(longitude__range=(min_lng, max_lng)).annotate(geo_distance=approx).filter(
+        geo_distance__lte=bound(radius_km)
+    ).order_by('geo_distance', 'pk').values_list('pk', 'latitude', 'longitude')
+
+    rows = list(candidates[:limit])
+    hits = _closest(latitude, longitude, rows, radius_km, limit)
+    if len(rows) == limit:
+        # Rows further down the approximate order may still be nearer than
+        # the furthest hit; their lower bound tells which ones can be
+        furthest = hits[-1][0] if len(hits) == limit else radius_km
+        rows = candidates.filter(geo_distance__lte=bound(furthest))
+        hits = _closest(latitude, longitude, rows, radius_km, limit)
+    return hits
+
+
+def _closest(latitude, longitude, rows, radius_km, limit):
+    """The `limit` nearest (distance_km, pk) of (pk, latitude, longitude) rows within `radius_km`."""
+    hits = (
+        (haversine_km(latitude, longitude, lat, lng), pk)
+        for pk, lat, lng in rows
+    )
+    return sorted(hit for hit in hits if hit[0] <= radius_km)[:limit]
+
+
+def nearest(queryset, latitude, longitude, limit, radius_km=None):
+    """
+    Nearest `limit` campaigns. Without a radius the search starts small and
+    doubles until enough campaigns are found, so dense areas stay cheap.
+    """
+    if radius_km is not None:
+        return within_radius(queryset, latitude, longitude, radius_km, limit)
+    radius_km = INITIAL_SEARCH_RADIUS_KM
+    while True:
+        hits = within_radius(queryset, latitude, longitude, radius_km, limit)
+        if len(hits) >= limit or radius_km >= MAX_SEARCH_RADIUS_KM:
+            return hits
+        radius_km = min(radius_km * 2, MAX_SEARCH_RADIUS_KM)
@@ -0,0 +1,90 @@
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import VaccineCampaign, VaccineSchedule
+from . import availability
+
+
+def claim_slot(schedule_id, count=1):
+    """
+    Atomically take `count` slots from a schedule.
+
+    The check and the decrement happen in a single conditional UPDATE, so the
+    counter can never go below zero. Inside a transaction the UPDATE keeps
+    the row locked until commit: claim last, right before the INSERT the
+    claim is for, so concurrent bookings wait only for that INSERT and the
+    commit. Returns True when the slots were claimed.
+    """
+    claimed = VaccineSchedule.objects.filter(
+        pk=schedule_id,
+        available_slots__gte=count
+    ).update(
+        available_slots=F('available_slots') - count,
+        updated_at=timezone.now()
+    )
+    if claimed:
+        transaction.on_commit(lambda: availability.adjust_slots(schedule_id, -count))
+    return claimed == 1
+
+
+def release_slot(schedule_id, count=1):
+    """Give `count` previously claimed slots back to a schedule."""
+    VaccineSchedule.objects.filter(pk=schedule_id).update(
+        available_slots=F('available_slots') + count,
+        updated_at=timezone.now()
+    )
+    transaction.on_commit(lambda: availability.adjust_slots(schedule_id, count))
+
+
+def release_slots(counts):
+    """Give slots back to many schedules in one UPDATE; `counts` maps schedule id to slots."""
+    counts = {pk: n for pk, n in counts.items() if n}
+    if not counts:
+        return
+    VaccineSchedule.objects.filter(pk__in=counts).update(
+        available_slots=F('available_slots') + Case(*[When(pk=pk, then=Value(n)) for pk, n in counts.items()]),
+        updated_at=timezone.now()
+    )
+    transaction.on_commit(lambda: [availability.adjust_slots(pk, n) for pk, n in counts.items()])
+
+
+def claim_participant(campaign_id, count=1):
+    """
+    Atomically count `count` new participants against a campaign's
+    max_participants. Like claim_slot, the cap check and the increment are a
+    single conditional UPDATE. Returns True when the participants were added.
+    """
+    claimed = VaccineCampaign.objects.filter(
+        pk=campaign_id,
+        participant_count__lte=F('max_participants') - count
+    ).update(
+        participant_count=F('participant_count') + count,
+        updated_at=timezone.now()
+    )
+    return claimed == 1
+
+
+def release_participant(campaign_id, count=1):
+    """Remove `count` participants from a campaign's counter."""
+    VaccineCampaign.objects.filter(
+        pk=campaign_id,
+        participant_count__gte=count
+    ).update(
+        participant_count=F('participant_count') - count,
+        updated_at=timezone.now()
+    )
+
+
+def release_participants(counts):
+    """release_participant for many campaigns in one UPDATE; `counts` maps campaign id to places."""
+    counts = {pk: n for pk, n in counts.items() if n}
+    if not counts:
+        return
+    VaccineCampaign.objects.filter(pk__in=counts).update(
+        participant_count=Greatest(
+            F('participant_count') - Case(*[When(pk=pk, then=Value(n)) for pk, n in counts.items()]),
+            Value(0)
+        ),
+        updated_at=timezone.now()
+    )
@@ -0,0 +1,126 @@
+"""
+Shared helpers for the ``bench_*`` management commands.
+
+Benchmarks create their own throwaway doctor, patients and campaigns and
+remove them again when they finish. Run them against the same database
+engine as production (PostgreSQL) for meaningful numbers; SQLite serialises
+all writers and will mostly measure its own file lock.
+"""
+import math
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time as dt_time, timedelta
+from django.db import connection, transaction
+from django.utils import timezone
+from bookings.allocation import claim_second_doses, plan_second_doses
+from bookings.models import VaccineRecord
+from campaigns.inventory import claim_slot
+from campaigns.models import VaccineCampaign, VaccineSchedule
+from users.models import User
+
+
+def create_users(role, count, prefix='bench'):
+    tag = uuid.uuid4().hex[:8]
+    users = [
+        User(
+            email=f"{prefix}-{tag}-{i}@example.com",
+            nid=f"{tag}{i:010d}",
+            role=role,
+            first_name='Bench',
+            last_name=str(i),
+            password='!',
+        )
+        for i in range(count)
+    ]
+    User.objects.bulk_create(users, batch_size=1000)
+    return list(User.objects.filter(email__startswith=f"{prefix}-{tag}-").order_by('id'))
+
+
+def create_campaign(doctor, slots, **extra):
+    today = timezone.now().date()
+    fields = {
+        'name': 'Benchmark campaign',
+        'description': 'Throwaway campaign created by a benchmark command',
+        'vaccine_type': 'Benchmark',
+        'start_date': today,
+        'end_date': today + timedelta(days=60),
+        'max_participants': slots,
+        'created_by': doctor,
+        'status': VaccineCampaign.ACTIVE,
+    }
+    fields.update(extra)
+    campaign = VaccineCampaign.objects.create(**fields)
+    schedule = VaccineSchedule.objects.create(
+        campaign=campaign,
+        date=today + timedelta(days=1),
+        available_slots=slots,
+        start_time=dt_time(9, 0),
+        end_time=dt_time(17, 0),
+    )
+    return campaign, schedule
+
+
+def book(campaign, schedule, patient):
+    """The booking path of POST /campaigns/{id}/booking/ without the HTTP layer."""
+    record = VaccineRecord(
+        patient=patient,
+        campaign=campaign,
+        first_dose_schedule=schedule,
+        status=VaccineRecord.SCHEDULED
+    )
+    with transaction.atomic():
+        second_doses = plan_second_doses([record], first_doses_claimed=False)
+        if not claim_slot(schedule.pk):
+            return False
+        claim_second_doses(second_doses)
+        record.save()
+    return True
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def run_concurrently(func, items, workers):
+    """
+    Call ``func(item)`` for every item from ``workers`` threads.
+
+    Returns ``(results, latencies, errors, elapsed)`` where latencies are in
+    seconds. Every worker thread closes its own database connection when it
+    runs out of work.
+    """
+    items = list(items)
+    latencies = []
+    results = []
+    errors = []
+
+    def worker(chunk):
+        try:
+            for item in chunk:
+                started = time.perf_counter()
+                try:
+                    results.append(func(item))
+                except Exception as e:
+                    errors.append(e)
+                latencies.append(time.perf_counter() - started)
+        finally:
+            connection.close()
+
+    chunks = [items[i::workers] for i in range(workers)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, chunks))
+    elapsed = time.perf_counter() - started
+    return results, latencies, errors, elapsed
+
+
+def format_latency(latencies):
+    return (
+        f"p50={percentile(latencies, 50) * 1000:.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:.1f}ms"
+    )
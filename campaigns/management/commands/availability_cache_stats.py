@@ -0,0 +1,25 @@
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from campaigns import availability
+
+
+class Command(BaseCommand):
+    help = "Report the hit ratio of the campaign availability cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Reset the counters after reporting")
+
+    def handle(self, *args, **options):
+        if isinstance(availability.get_cache(), (LocMemCache, DummyCache)):
+            # The counters live in each web process's own memory, out of this command's reach
+            raise CommandError(
+                "The availability cache is not shared between processes; set AVAILABILITY_CACHE_BACKEND "
+                "to a shared backend (Redis, Memcached, database) to read its hit ratio."
+            )
+        stats = availability.get_stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} hit_ratio={stats['hit_ratio']:.1%}"
+        )
+        if options['reset']:
+            availability.reset_stats()
@@ -0,0 +1,92 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from bookings.allocation import allocate_second_doses, claim_second_doses, plan_second_doses
+from bookings.models import VaccineRecord
+from campaigns.inventory import claim_slot
+from campaigns.models import VaccineSchedule
+from users.models import User
+from ._bench import create_users, create_campaign, run_concurrently, format_latency
+
+
+def book_with_row_lock(campaign, schedule_id, patient):
+    """The original booking path: the schedule row stays locked until commit."""
+    with transaction.atomic():
+        schedule = VaccineSchedule.objects.select_for_update().get(pk=schedule_id)
+        if schedule.available_slots <= 0:
+            return False
+        schedule.available_slots = F('available_slots') - 1
+        schedule.save()
+        record = VaccineRecord(
+            patient=patient,
+            campaign=campaign,
+            first_dose_schedule=schedule,
+            status=VaccineRecord.SCHEDULED
+        )
+        allocate_second_doses([record])
+        record.save()
+    return True
+
+
+def book_with_claim(campaign, schedule_id, patient):
+    """The current booking path: resolve the second dose, claim both slots with conditional UPDATEs, then create."""
+    record = VaccineRecord(
+        patient=patient,
+        campaign=campaign,
+        first_dose_schedule=VaccineSchedule.objects.get(pk=schedule_id),
+        status=VaccineRecord.SCHEDULED
+    )
+    with transaction.atomic():
+        second_doses = plan_second_doses([record], first_doses_claimed=False)
+        if not claim_slot(schedule_id):
+            return False
+        claim_second_doses(second_doses)
+        record.save()
+    return True
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent bookings on one schedule: row-lock path vs slot claim path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=500)
+        parser.add_argument('--slots', type=int, default=None,
+                            help="Slots on the schedule (defaults to --bookings)")
+        parser.add_argument('--workers', type=int, default=16)
+
+    def handle(self, *args, **options):
+        bookings = options['bookings']
+        slots = options['slots'] or bookings
+        workers = options['workers']
+
+        doctor = create_users(User.Role.DOCTOR, 1)[0]
+        try:
+            for label, book in [('row lock', book_with_row_lock), ('slot claim', book_with_claim)]:
+                self.run_path(label, book, doctor, bookings, slots, workers)
+        finally:
+            doctor.delete()
+
+    def run_path(self, label, book, doctor, bookings, slots, workers):
+        patients = create_users(User.Role.PATIENT, bookings)
+        campaign, schedule = create_campaign(doctor, slots)
+        try:
+            results, latencies, errors, elapsed = run_concurrently(
+                lambda patient: book(campaign, schedule.id, patient), patients, workers
+            )
+            booked = sum(1 for r in results if r)
+            schedule.refresh_from_db()
+            records = VaccineRecord.objects.filter(first_dose_schedule=schedule).count()
+            oversold = records > slots or schedule.available_slots != slots - records
+
+            self.stdout.write(
+                f"{label:>10}: {booked / elapsed:8.1f} bookings/sec  {format_latency(latencies)}  "
+                f"booked={booked} rejected={len(results) - booked} errors={len(errors)} "
+                f"remaining={schedule.available_slots}"
+            )
+            if oversold:
+                self.stdout.write(self.style.ERROR(f"{label}: slot counter and records disagree"))
+            if errors:
+                self.stdout.write(self.style.WARNING(f"{label}: first error: {errors[0]!r}"))
+        finally:
+            campaign.delete()
+            User.objects.filter(pk__in=[p.pk for p in patients]).delete()
@@ -0,0 +1,77 @@
+import time
+from django.core.management.base import BaseCommand
+from bookings.models import BookingRequest, VaccineRecord
+from bookings.queue import enqueue, process_batch, BATCH_SIZE
+from campaigns.inventory import claim_participant, release_participant
+from users.models import User
+from ._bench import book, create_users, create_campaign, run_concurrently, format_latency
+
+
+def book_now(campaign, schedule, patient):
+    """The synchronous booking action: participant claim, then slot claim and record."""
+    if not claim_participant(campaign.pk):
+        return False
+    try:
+        booked = book(campaign, schedule, patient)
+    except Exception:
+        release_participant(campaign.pk)
+        raise
+    if not booked:
+        release_participant(campaign.pk)
+    return booked
+
+
+def accept(campaign, schedule, patient):
+    """The queued booking action: store the request and hand back a ticket."""
+    enqueue(patient, campaign, schedule)
+    return True
+
+
+class Command(BaseCommand):
+    help = "Benchmark accepted booking requests/sec: synchronous booking vs queued intake"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        bookings = options['bookings']
+        workers = options['workers']
+
+        doctor = create_users(User.Role.DOCTOR, 1)[0]
+        try:
+            self.run_path('synchronous', book_now, doctor, bookings, workers)
+            self.run_path('queued', accept, doctor, bookings, workers, options['batch_size'])
+        finally:
+            doctor.delete()
+
+    def run_path(self, label, handle_request, doctor, bookings, workers, batch_size=None):
+        patients = create_users(User.Role.PATIENT, bookings)
+        campaign, schedule = create_campaign(doctor, bookings)
+        try:
+            results, latencies, errors, elapsed = run_concurrently(
+                lambda patient: handle_request(campaign, schedule, patient), patients, workers
+            )
+            accepted = sum(1 for r in results if r)
+            self.stdout.write(
+                f"{label:>11}: {accepted / elapsed:8.1f} accepted requests/sec  {format_latency(latencies)}  "
+                f"accepted={accepted} errors={len(errors)}"
+            )
+            if errors:
+                self.stdout.write(self.style.WARNING(f"{label}: first error: {errors[0]!r}"))
+
+            if batch_size:
+                started = time.perf_counter()
+                while any(process_batch(batch_size)):
+                    pass
+                drained = time.perf_counter() - started
+                booked = VaccineRecord.objects.filter(campaign=campaign).count()
+                self.stdout.write(
+                    f"{'':>11}  queue drained in {drained:.2f}s ({booked / drained:.0f} bookings/sec), "
+                    f"booked={booked} failed="
+                    f"{BookingRequest.objects.filter(campaign=campaign, status=BookingRequest.FAILED).count()}"
+                )
+        finally:
+            campaign.delete()
+            User.objects.filter(pk__in=[p.pk for p in patients]).delete()
@@ -0,0 +1,54 @@
+import time
+from datetime import time as dt_time
+from django.core.management.base import BaseCommand
+from bookings.bulk import book_in_bulk
+from campaigns.models import VaccineSchedule
+from users.models import User
+from ._bench import create_users, create_campaign
+
+
+class Command(BaseCommand):
+    help = "Benchmark the bulk booking import on seeded patients"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=10000)
+        parser.add_argument('--windows', type=int, default=20,
+                            help="Schedules the bookings are spread over")
+
+    def handle(self, *args, **options):
+        bookings = options['bookings']
+        windows = options['windows']
+        slots = -(-bookings // windows)
+
+        doctor = create_users(User.Role.DOCTOR, 1)[0]
+        patients = create_users(User.Role.PATIENT, bookings)
+        campaign, first = create_campaign(doctor, slots, max_participants=bookings)
+        try:
+            VaccineSchedule.objects.bulk_create([
+                VaccineSchedule(
+                    campaign=campaign,
+                    date=first.date,
+                    available_slots=slots,
+                    start_time=dt_time(i // 4, (i % 4) * 15),
+                    end_time=dt_time(i // 4, (i % 4) * 15 + 10),
+                )
+                for i in range(1, windows)
+            ])
+            rows = [
+                {'patient': patient.nid if i % 2 else patient.email}
+                for i, patient in enumerate(patients)
+            ]
+
+            started = time.perf_counter()
+            report = book_in_bulk(campaign.id, rows)
+            elapsed = time.perf_counter() - started
+
+            self.stdout.write(
+                f"bulk import: {len(rows)} row(s) in {elapsed:.2f}s "
+                f"({report['booked'] / elapsed:.0f} bookings/sec) "
+                f"booked={report['booked']} failed={report['failed']}"
+            )
+        finally:
+            campaign.delete()
+            User.objects.filter(pk__in=[p.pk for p in patients]).delete()
+            doctor.delete()
@@ -0,0 +1,78 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from campaigns import geo
+from campaigns.models import VaccineCampaign
+from users.models import User
+from ._bench import create_users, percentile
+
+# Roughly the bounding box of Bangladesh
+MIN_LAT, MAX_LAT = 20.6, 26.6
+MIN_LNG, MAX_LNG = 88.0, 92.7
+
+
+class Command(BaseCommand):
+    help = "Benchmark nearest / within-radius campaign queries on seeded campaigns"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaigns', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+
+    def handle(self, *args, **options):
+        # Everything runs inside one transaction that is rolled back at the end
+        with transaction.atomic():
+            self.seed(options['campaigns'])
+            rng = random.Random(7)
+            points = [
+                (rng.uniform(MIN_LAT, MAX_LAT), rng.uniform(MIN_LNG, MAX_LNG))
+                for _ in range(options['queries'])
+            ]
+            for label, radius_km, limit in [
+                ('within 5km', 5, 100),
+                ('within 10km', 10, 100),
+                ('within 25km', 25, 100),
+                ('nearest 10', None, 10),
+            ]:
+                self.run_queries(label, points, radius_km, limit)
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        doctor = create_users(User.Role.DOCTOR, 1)[0]
+        today = timezone.now().date()
+        rng = random.Random(42)
+        started = time.perf_counter()
+        campaigns = []
+        for i in range(count):
+            latitude = rng.uniform(MIN_LAT, MAX_LAT)
+            longitude = rng.uniform(MIN_LNG, MAX_LNG)
+            campaigns.append(VaccineCampaign(
+                name=f"Campaign {i}",
+                description='Benchmark campaign',
+                vaccine_type='Benchmark',
+                latitude=latitude,
+                longitude=longitude,
+                geohash=geo.encode(latitude, longitude),
+                start_date=today,
+                end_date=today + timedelta(days=30),
+                max_participants=100,
+                created_by=doctor,
+            ))
+        VaccineCampaign.objects.bulk_create(campaigns, batch_size=2000)
+        self.stdout.write(f"seeded {count} campaigns in {time.perf_counter() - started:.1f}s")
+
+    def run_queries(self, label, points, radius_km, limit):
+        queryset = VaccineCampaign.objects.all()
+        timings = []
+        found = 0
+        for latitude, longitude in points:
+            started = time.perf_counter()
+            hits = geo.nearest(queryset, latitude, longitude, limit, radius_km=radius_km)
+            timings.append(time.perf_counter() - started)
+            found += len(hits)
+        self.stdout.write(
+            f"{label:>12}: avg_results={found / len(points):6.1f} "
+            f"p50={percentile(timings, 50) * 1000:6.2f}ms p99={percentile(timings, 99) * 1000:6.2f}ms"
+        )
@@ -0,0 +1,57 @@
+import threading
+from django.core.management.base import BaseCommand
+from sslcommerz_lib import SSLCOMMERZ
+from bookings.fake_gateway import make_server
+from bookings.gateway import SESSION_PATH, SSLCommerzGateway, build_session
+from ._bench import run_concurrently, format_latency
+
+CREDENTIALS = {'store_id': 'bench', 'store_pass': 'bench', 'issandbox': True}
+
+
+def session_body(i):
+    return {'total_amount': 100, 'currency': 'BDT', 'tran_id': f"txn_{i}"}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark checkout session creation against a local fake gateway: "
+        "per-call client vs pooled gateway client"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--latency', type=float, default=0.02,
+                            help="Seconds the fake gateway waits before answering")
+        parser.add_argument('--fail-rate', type=float, default=0.0,
+                            help="Share of requests the fake gateway answers with 503")
+
+    def handle(self, *args, **options):
+        server = make_server(latency=options['latency'], fail_rate=options['fail_rate'])
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address[:2]
+        base_url = f"http://{host}:{port}"
+        count, workers = options['requests'], options['workers']
+        try:
+            per_call = SSLCOMMERZ(CREDENTIALS)
+            per_call.createSessionUrl = base_url + SESSION_PATH
+            pooled = SSLCommerzGateway(CREDENTIALS, build_session(workers, 2), (3.05, 15), base_url)
+
+            self.run_sync('per-call client', per_call, count, workers)
+            self.run_sync('pooled client', pooled, count, workers)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def run_sync(self, label, gateway, count, workers):
+        results, latencies, errors, elapsed = run_concurrently(
+            lambda i: gateway.createSession(session_body(i)), range(count), workers
+        )
+        self.report(label, results, latencies, len(errors), elapsed)
+
+    def report(self, label, results, latencies, errors, elapsed):
+        ok = sum(1 for r in results if r and r.get('status') == 'SUCCESS')
+        self.stdout.write(
+            f"{label:16s} {len(results) / elapsed:8.1f} sessions/sec  {format_latency(latencies)}  "
+            f"ok={ok} failed={len(results) - ok + errors}"
+        )
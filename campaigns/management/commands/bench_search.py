@@ -0,0 +1,79 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from campaigns.models import VaccineCampaign
+from campaigns.search import CampaignSearchFilter
+from users.models import User
+from ._bench import create_users, percentile
+
+VACCINES = ['COVID-19', 'Influenza', 'Hepatitis B', 'Measles', 'Polio', 'Rabies', 'Typhoid', 'HPV', 'Tetanus', 'Cholera']
+LOCATIONS = ['Dhaka', 'Chattogram', 'Khulna', 'Rajshahi', 'Sylhet', 'Barishal', 'Rangpur', 'Mymensingh', 'Cumilla', 'Gazipur']
+WORDS = ['community', 'school', 'booster', 'children', 'elderly', 'free', 'mobile', 'clinic', 'district', 'outreach',
+         'seasonal', 'urgent', 'hospital', 'union', 'ward', 'workers', 'garment', 'university', 'mothers', 'travel']
+QUERIES = ['influenza', 'hepatitis dhaka', 'polio children', 'garment workers', 'influnza', 'hepatits', 'sylhet boostr']
+
+
+class BenchView:
+    search_fields = ['name', 'description', 'location', 'vaccine_type']
+
+
+class Command(BaseCommand):
+    help = "Benchmark campaign search: DRF SearchFilter (icontains) vs CampaignSearchFilter"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaigns', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Everything runs inside one transaction that is rolled back at the end
+        with transaction.atomic():
+            self.seed(options['campaigns'])
+            for label, backend in [('icontains', SearchFilter()), ('indexed', CampaignSearchFilter())]:
+                self.run_backend(label, backend, options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, count):
+        doctor = create_users(User.Role.DOCTOR, 1)[0]
+        today = timezone.now().date()
+        rng = random.Random(42)
+        started = time.perf_counter()
+        campaigns = []
+        for i in range(count):
+            vaccine = rng.choice(VACCINES)
+            location = rng.choice(LOCATIONS)
+            campaigns.append(VaccineCampaign(
+                name=f"{vaccine} {rng.choice(WORDS)} drive {i}",
+                description=' '.join(rng.choices(WORDS, k=12)),
+                vaccine_type=vaccine,
+                location=location,
+                start_date=today,
+                end_date=today + timedelta(days=30),
+                max_participants=100,
+                created_by=doctor,
+            ))
+        VaccineCampaign.objects.bulk_create(campaigns, batch_size=2000)
+        self.stdout.write(f"seeded {count} campaigns in {time.perf_counter() - started:.1f}s")
+
+    def run_backend(self, label, backend, repeat):
+        factory = APIRequestFactory()
+        view = BenchView()
+        for text in QUERIES:
+            request = Request(factory.get('/', {'search': text}))
+            timings = []
+            matches = 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                qs = backend.filter_queryset(request, VaccineCampaign.objects.all(), view)
+                matches = qs.count()
+                list(qs[:10])
+                timings.append(time.perf_counter() - started)
+            self.stdout.write(
+                f"{label:>9} {text!r:>18}: matches={matches:<6} "
+                f"avg={sum(timings) / len(timings) * 1000:7.1f}ms p99={percentile(timings, 99) * 1000:7.1f}ms"
+            )
@@ -0,0 +1,94 @@
+from datetime import time as dt_time
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from bookings.allocation import second_dose_window
+from bookings.models import VaccineRecord
+from campaigns.models import VaccineSchedule
+from users.models import User
+from ._bench import book, create_users, create_campaign, run_concurrently, format_latency
+
+
+class Command(BaseCommand):
+    help = (
+        "Book concurrently across several first-dose windows and verify second-dose "
+        "allocation: one schedule per window and no oversold second-dose slots"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=400)
+        parser.add_argument('--windows', type=int, default=4,
+                            help="First-dose windows the bookings are spread over")
+        parser.add_argument('--second-dose-slots', type=int, default=None,
+                            help="Pre-create every second-dose window with this many slots "
+                                 "(by default the allocator creates them)")
+        parser.add_argument('--workers', type=int, default=16)
+
+    def handle(self, *args, **options):
+        bookings = options['bookings']
+        windows = options['windows']
+        workers = options['workers']
+
+        doctor = create_users(User.Role.DOCTOR, 1)[0]
+        patients = create_users(User.Role.PATIENT, bookings)
+        slots = -(-bookings // windows)
+        campaign, first = create_campaign(doctor, slots, max_participants=bookings)
+        try:
+            schedules = [first] + [
+                VaccineSchedule.objects.create(
+                    campaign=campaign,
+                    date=first.date,
+                    available_slots=slots,
+                    start_time=dt_time(8 + i, 0),
+                    end_time=dt_time(8 + i, 30),
+                )
+                for i in range(1, windows)
+            ]
+            if options['second_dose_slots'] is not None:
+                probe = VaccineRecord(campaign=campaign)
+                for schedule in schedules:
+                    probe.first_dose_schedule = schedule
+                    _, date, start_time, end_time = second_dose_window(probe)
+                    VaccineSchedule.objects.create(
+                        campaign=campaign, date=date, start_time=start_time, end_time=end_time,
+                        available_slots=options['second_dose_slots'],
+                    )
+            capacity = dict(VaccineSchedule.objects.filter(campaign=campaign).values_list('pk', 'available_slots'))
+
+            jobs = [(schedules[i % windows], patient) for i, patient in enumerate(patients)]
+            results, latencies, errors, elapsed = run_concurrently(
+                lambda job: book(campaign, *job), jobs, workers
+            )
+            booked = sum(1 for r in results if r)
+            self.stdout.write(
+                f"booking: {booked / elapsed:8.1f} bookings/sec  {format_latency(latencies)}  "
+                f"booked={booked} rejected={len(results) - booked + len(errors)}"
+            )
+            self.verify(campaign, capacity, slots)
+        finally:
+            campaign.delete()
+            User.objects.filter(pk__in=[p.pk for p in patients]).delete()
+            doctor.delete()
+
+    def verify(self, campaign, capacity, slots):
+        duplicates = VaccineSchedule.objects.filter(campaign=campaign).values(
+            'date', 'start_time', 'end_time'
+        ).annotate(n=Count('id')).filter(n__gt=1).count()
+        problems = []
+        if duplicates:
+            problems.append(f"{duplicates} duplicated window(s)")
+
+        for schedule in VaccineSchedule.objects.filter(campaign=campaign).annotate(
+            firsts=Count('first_dose_bookings', distinct=True),
+            seconds=Count('second_dose_bookings', distinct=True),
+        ):
+            # Windows created by the allocator are sized like the first-dose windows
+            start = capacity.get(schedule.pk, slots)
+            if schedule.firsts + schedule.seconds + schedule.available_slots != start:
+                problems.append(f"schedule {schedule.pk}: counter and bookings disagree")
+
+        missing = VaccineRecord.objects.filter(campaign=campaign, second_dose_schedule__isnull=True).count()
+        if missing:
+            problems.append(f"{missing} record(s) without a second dose")
+        if problems:
+            raise CommandError("; ".join(problems))
+        self.stdout.write(self.style.SUCCESS("no duplicate windows, no oversold slots"))
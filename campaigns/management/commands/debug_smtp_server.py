@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from bookings.debug_smtp import make_server
+
+
+class Command(BaseCommand):
+    help = "Run a local SMTP server that accepts and prints every message (for the dose reminders)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+
+    def handle(self, *args, **options):
+        server = make_server(options['host'], options['port'], verbose=True)
+        host, port = server.server_address[:2]
+        self.stdout.write(f"Debug SMTP server on {host}:{port} (EMAIL_HOST={host} EMAIL_PORT={port} EMAIL_USE_TLS=False)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from bookings.fake_gateway import make_server
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in for the SSLCommerz API (set PAYMENT_GATEWAY_URL to its address)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.0,
+                            help="Seconds to wait before answering each request")
+        parser.add_argument('--fail-rate', type=float, default=0.0,
+                            help="Share of requests answered with 503")
+        parser.add_argument('--paid-rate', type=float, default=0.5,
+                            help="Share of queried transactions reported as paid")
+
+    def handle(self, *args, **options):
+        server = make_server(options['host'], options['port'], options['latency'],
+                             options['fail_rate'], options['paid_rate'], verbose=True)
+        host, port = server.server_address[:2]
+        self.stdout.write(f"Fake payment gateway on http://{host}:{port} (PAYMENT_GATEWAY_URL=http://{host}:{port})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
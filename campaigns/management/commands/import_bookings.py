@@ -0,0 +1,40 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from bookings.bulk import book_in_bulk, parse_rows, BulkBookingError, FAILED
+from campaigns.models import VaccineCampaign
+
+
+class Command(BaseCommand):
+    help = "Book patients into a campaign from a CSV or JSONL file of NIDs / emails"
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_id', type=int)
+        parser.add_argument('path', help="CSV with a `patient` column (plus optional schedule_id / date), or JSONL")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], default=None,
+                            help="Defaults to the file extension")
+        parser.add_argument('--dry-run', action='store_true', help="Validate and report without booking")
+        parser.add_argument('--report', default=None, help="Write the per-row results to this JSONL file")
+
+    def handle(self, *args, **options):
+        if not VaccineCampaign.objects.filter(pk=options['campaign_id']).exists():
+            raise CommandError(f"Campaign {options['campaign_id']} does not exist")
+        try:
+            with open(options['path'], 'rb') as stream:
+                rows = parse_rows(stream, options['format'], options['path'])
+            report = book_in_bulk(options['campaign_id'], rows, dry_run=options['dry_run'])
+        except (OSError, BulkBookingError) as e:
+            raise CommandError(str(e))
+
+        if options['report']:
+            with open(options['report'], 'w') as out:
+                for result in report['results']:
+                    out.write(json.dumps(result) + '\n')
+        else:
+            for result in report['results']:
+                if result['status'] == FAILED:
+                    self.stdout.write(f"row {result['row']} ({result['patient']}): {result['detail']}")
+
+        prefix = "[dry run] " if report['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Booked {report['booked']}, failed {report['failed']}"
+        ))
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from bookings.missed import mark_missed_doses, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Mark scheduled bookings whose last scheduled dose has passed as MISSED"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-days', type=int, default=0,
+                            help="Days after the last dose date before a booking counts as missed")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Records marked per transaction")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"missed {stats['missed']} ({stats['missed'] / elapsed:.1f}/sec)"
+            )
+
+        stats = mark_missed_doses(
+            grace_days=options['grace_days'],
+            batch_size=options['batch_size'],
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Marked {stats['missed']} booking(s) missed in {elapsed:.2f}s"
+        ))
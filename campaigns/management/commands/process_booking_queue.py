@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from bookings.queue import process_batch, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Book pending queued booking requests in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help="Keep polling for new requests instead of exiting when the queue is empty")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds to wait between polls of an empty queue with --loop")
+
+    def handle(self, *args, **options):
+        total_booked = total_failed = 0
+        try:
+            while True:
+                booked, failed = process_batch(options['batch_size'])
+                total_booked += booked
+                total_failed += failed
+                if booked or failed:
+                    self.stdout.write(f"Processed {booked + failed} request(s): {booked} booked, {failed} failed")
+                elif options['loop']:
+                    time.sleep(options['interval'])
+                else:
+                    break
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Booked {total_booked}, failed {total_failed}"))
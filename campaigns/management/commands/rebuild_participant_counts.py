@@ -0,0 +1,31 @@
+from collections import Counter
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from campaigns.models import VaccineCampaign
+from bookings.models import Payment, VaccineRecord
+
+
+class Command(BaseCommand):
+    help = "Recompute every campaign's participant_count from its vaccine records and live payment holds"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Locked first, so claims made while counting wait for the rebuild
+            campaigns = list(VaccineCampaign.objects.select_for_update().only('id', 'participant_count'))
+            counts = Counter(dict(
+                VaccineRecord.objects.values('campaign').annotate(n=Count('id')).values_list('campaign', 'n')
+            ))
+            # Pending premium payments hold a place until they are paid, fail or expire
+            counts.update(dict(
+                Payment.objects.filter(payment_status=Payment.PENDING, hold_expires_at__isnull=False)
+                .values('campaign_id').order_by().annotate(n=Count('id')).values_list('campaign_id', 'n')
+            ))
+            stale = []
+            for campaign in campaigns:
+                actual = counts.get(campaign.id, 0)
+                if campaign.participant_count != actual:
+                    campaign.participant_count = actual
+                    stale.append(campaign)
+            VaccineCampaign.objects.bulk_update(stale, ['participant_count'], batch_size=1000)
+        self.stdout.write(self.style.SUCCESS(f"Corrected {len(stale)} of {len(campaigns)} campaign(s)"))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from bookings.ratings import rebuild_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute campaign rating summaries from the reviews"
+
+    def handle(self, *args, **options):
+        count = rebuild_summaries()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {count} campaign(s)"))
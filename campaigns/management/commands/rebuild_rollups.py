@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from bookings.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily campaign rollups behind the analytics endpoint"
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} campaign day(s)"))
@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from bookings.reconcile import reconcile, BATCH_SIZE, CONCURRENCY
+
+
+class Command(BaseCommand):
+    help = "Ask the payment gateway about payments whose callback never arrived and settle them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=30,
+                            help="Only payments created at least this many minutes ago")
+        parser.add_argument('--max-age', type=int, default=72,
+                            help="Skip payments created more than this many hours ago")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                            help="Gateway queries in flight per batch")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"checked {stats['checked']} ({stats['checked'] / elapsed:.1f}/sec): "
+                f"booked={stats['booked']} closed={stats['closed']} open={stats['open']} "
+                f"paid_unbooked={stats['paid_unbooked']} mismatched={stats['mismatched']} errors={stats['errors']}"
+            )
+
+        stats = reconcile(
+            older_than=timedelta(minutes=options['older_than']),
+            max_age=timedelta(hours=options['max_age']),
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Reconciled {stats['checked']} payment(s) in {elapsed:.2f}s: {stats['booked']} booked, "
+            f"{stats['closed']} closed, {stats['open']} still open, {stats['errors']} gateway error(s)"
+        ))
+        if stats['paid_unbooked']:
+            self.stdout.write(self.style.WARNING(
+                f"{stats['paid_unbooked']} paid payment(s) could not be booked (campaign, slot or schedule gone)"
+            ))
+        if stats['mismatched']:
+            self.stdout.write(self.style.WARNING(
+                f"{stats['mismatched']} payment(s) left pending: the gateway reports a different amount or currency"
+            ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from bookings.holds import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = "Give back the slots of premium bookings whose payment hold expired"
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired payment hold(s)"))
@@ -0,0 +1,107 @@
+import random
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+from bookings.fake_gateway import make_server
+from bookings.gateway import get_gateway
+from bookings.holds import create_hold
+from bookings.models import Payment, VaccineRecord
+from bookings.views import payment_fail, payment_success
+from users.models import User
+from ._bench import create_users, create_campaign, run_concurrently, format_latency
+
+
+class Command(BaseCommand):
+    help = (
+        "Stand in for the payment gateway: replay success and fail callbacks for premium "
+        "holds concurrently, verified against a local fake gateway, and check every payment "
+        "booked at most once"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=200)
+        parser.add_argument('--replays', type=int, default=5,
+                            help="Success callbacks sent per payment")
+        parser.add_argument('--fail-callbacks', type=int, default=1,
+                            help="Fail callbacks racing the success callbacks per payment")
+        parser.add_argument('--paid-rate', type=float, default=0.8,
+                            help="Share of payments the fake gateway reports as paid; the rest were declined")
+        parser.add_argument('--workers', type=int, default=16)
+
+    def handle(self, *args, **options):
+        count = options['payments']
+        doctor = create_users(User.Role.DOCTOR, 1)[0]
+        patients = create_users(User.Role.PATIENT, count)
+        campaign, schedule = create_campaign(doctor, count, is_premium=True, premium_price=100)
+        server = make_server()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            payments = [create_hold(patient, campaign, schedule) for patient in patients]
+            factory = APIRequestFactory()
+            jobs = []
+            for payment in payments:
+                tran_id = f"txn_{payment.id}"
+                if random.random() < options['paid_rate']:
+                    val_id = server.pay(tran_id, payment.amount)
+                else:
+                    # Declined: a success callback for it carries a val_id the gateway does not know
+                    server.transactions[tran_id] = 'FAILED'
+                    val_id = f"forged-{payment.id}"
+                body = {'tran_id': tran_id, 'val_id': val_id, 'bank_tran_id': f"forged-{payment.id}"}
+                jobs += [(payment_success, body)] * options['replays']
+                jobs += [(payment_fail, body)] * options['fail_callbacks']
+            random.shuffle(jobs)
+
+            def deliver(job):
+                view, body = job
+                return view(factory.post('/api/v1/payment/callback/', body)).status_code
+
+            host, port = server.server_address[:2]
+            get_gateway.cache_clear()
+            with override_settings(PAYMENT_GATEWAY_URL=f"http://{host}:{port}"):
+                results, latencies, errors, elapsed = run_concurrently(deliver, jobs, options['workers'])
+            get_gateway.cache_clear()
+            self.stdout.write(
+                f"callbacks: {len(results) / elapsed:8.1f} callbacks/sec  {format_latency(latencies)}  "
+                f"delivered={len(results)} errors={len(errors)}"
+            )
+            for error in errors[:5]:
+                self.stderr.write(f"  {error!r}")
+            self.verify(campaign, schedule, count, len(server.payments))
+        finally:
+            server.shutdown()
+            server.server_close()
+            campaign.delete()
+            User.objects.filter(pk__in=[p.pk for p in patients]).delete()
+            doctor.delete()
+
+    def verify(self, campaign, schedule, count, paid_at_gateway):
+        payments = Payment.objects.filter(campaign_id=campaign.id)
+        records = VaccineRecord.objects.filter(campaign=campaign)
+        booked = records.count()
+        paid = payments.filter(payment_status=Payment.SUCCESS, record__isnull=False).count()
+        schedule.refresh_from_db()
+        campaign.refresh_from_db()
+
+        problems = []
+        doubled = records.values('patient').annotate(n=Count('id')).filter(n__gt=1).count()
+        if doubled:
+            problems.append(f"{doubled} patient(s) booked more than once")
+        if booked != paid:
+            problems.append(f"{booked} record(s) for {paid} paid payment(s)")
+        if booked != paid_at_gateway:
+            problems.append(f"{booked} record(s) for {paid_at_gateway} payment(s) the gateway reports as paid")
+        if payments.filter(payment_status=Payment.PENDING).exists():
+            problems.append("payments left pending")
+        if schedule.available_slots != count - booked:
+            problems.append(f"schedule has {schedule.available_slots} free slot(s), expected {count - booked}")
+        if campaign.participant_count != booked:
+            problems.append(f"participant count {campaign.participant_count}, expected {booked}")
+        if problems:
+            raise CommandError("; ".join(problems))
+        failed = payments.exclude(payment_status=Payment.SUCCESS).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"exactly once: {booked} booked, {failed} failed, no duplicates, counters consistent"
+        ))
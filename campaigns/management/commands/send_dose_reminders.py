@@ -0,0 +1,37 @@
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from bookings.reminders import send_reminders, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Email patients a reminder of their first or second dose tomorrow"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat,
+                            help="Remind doses on this day (YYYY-MM-DD) instead of tomorrow")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help="Messages sent per SMTP connection")
+        parser.add_argument('--rate', type=float,
+                            help="Messages per second (default REMINDER_RATE_LIMIT; 0 = no limit)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"sent {stats['sent']} ({stats['sent'] / elapsed:.1f} msgs/sec), failed {stats['failed']}"
+            )
+
+        stats = send_reminders(
+            day=options['date'],
+            batch_size=options['batch_size'],
+            rate=options['rate'],
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+        rate = stats['sent'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {stats['sent']} reminder(s) in {elapsed:.2f}s ({rate:.1f} msgs/sec), {stats['failed']} failed"
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from campaigns.models import VaccineCampaign
+
+
+class Command(BaseCommand):
+    help = "Move campaigns between UPCOMING, ACTIVE and COMPLETED from their start and end dates"
+
+    def handle(self, *args, **options):
+        changed = VaccineCampaign.objects.sync_statuses()
+        self.stdout.write(self.style.SUCCESS(f"Updated {changed} campaign(s)"))
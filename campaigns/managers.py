@@ -0,0 +1,27 @@
+from django.db import models
+from django.db.models import Case, When, Value, Q
+from django.db.models.functions import Now
+from django.utils import timezone
+
+
+class VaccineCampaignQuerySet(models.QuerySet):
+    def sync_statuses(self, today=None):
+        """
+        Move campaigns between UPCOMING, ACTIVE and COMPLETED based on their
+        start and end dates with a single set-based UPDATE. Only rows whose
+        status is actually stale are touched. Returns the number of rows changed.
+        """
+        model = self.model
+        today = today or timezone.now().date()
+
+        expected = Case(
+            When(end_date__lt=today, then=Value(model.COMPLETED)),
+            When(start_date__gt=today, then=Value(model.UPCOMING)),
+            default=Value(model.ACTIVE),
+        )
+        stale = (
+            (Q(end_date__lt=today) & ~Q(status=model.COMPLETED)) |
+            (Q(start_date__gt=today) & ~Q(status=model.UPCOMING)) |
+            (Q(start_date__lte=today, end_date__gte=today) & ~Q(status=model.ACTIVE))
+        )
+        return self.filter(stale).update(status=expected, updated_at=Now())
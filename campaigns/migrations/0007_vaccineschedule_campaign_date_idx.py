@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0006_vaccinecampaign_is_premium_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vaccineschedule',
+            index=models.Index(fields=['campaign', 'date'], name='schedule_campaign_date_idx'),
+        ),
+    ]
@@ -0,0 +1,100 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE campaigns_vaccinecampaign ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(vaccine_type, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(location, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX campaign_search_vector_idx ON campaigns_vaccinecampaign USING GIN (search_vector)",
+    "CREATE INDEX campaign_name_trgm_idx ON campaigns_vaccinecampaign USING GIN (name gin_trgm_ops)",
+    "CREATE INDEX campaign_vaccine_type_trgm_idx ON campaigns_vaccinecampaign USING GIN (vaccine_type gin_trgm_ops)",
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS campaign_vaccine_type_trgm_idx",
+    "DROP INDEX IF EXISTS campaign_name_trgm_idx",
+    "DROP INDEX IF EXISTS campaign_search_vector_idx",
+    "ALTER TABLE campaigns_vaccinecampaign DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE campaigns_vaccinecampaign_fts USING fts5(
+        name, vaccine_type, location, description,
+        content='campaigns_vaccinecampaign', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER campaigns_vaccinecampaign_fts_ai AFTER INSERT ON campaigns_vaccinecampaign BEGIN
+        INSERT INTO campaigns_vaccinecampaign_fts(rowid, name, vaccine_type, location, description)
+        VALUES (new.id, new.name, new.vaccine_type, new.location, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER campaigns_vaccinecampaign_fts_ad AFTER DELETE ON campaigns_vaccinecampaign BEGIN
+        INSERT INTO campaigns_vaccinecampaign_fts(campaigns_vaccinecampaign_fts, rowid, name, vaccine_type, location, description)
+        VALUES ('delete', old.id, old.name, old.vaccine_type, old.location, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER campaigns_vaccinecampaign_fts_au AFTER UPDATE ON campaigns_vaccinecampaign BEGIN
+        INSERT INTO campaigns_vaccinecampaign_fts(campaigns_vaccinecampaign_fts, rowid, name, vaccine_type, location, description)
+        VALUES ('delete', old.id, old.name, old.vaccine_type, old.location, old.description);
+        INSERT INTO campaigns_vaccinecampaign_fts(rowid, name, vaccine_type, location, description)
+        VALUES (new.id, new.name, new.vaccine_type, new.location, new.description);
+    END
+    """,
+    "INSERT INTO campaigns_vaccinecampaign_fts(campaigns_vaccinecampaign_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS campaigns_vaccinecampaign_fts_au",
+    "DROP TRIGGER IF EXISTS campaigns_vaccinecampaign_fts_ad",
+    "DROP TRIGGER IF EXISTS campaigns_vaccinecampaign_fts_ai",
+    "DROP TABLE IF EXISTS campaigns_vaccinecampaign_fts",
+]
+
+
+def run_for_vendor(postgres, sqlite):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        statements = {'postgresql': postgres, 'sqlite': sqlite}.get(vendor, [])
+        for sql in statements:
+            try:
+                schema_editor.execute(sql)
+            except OperationalError:
+                # SQLite builds without FTS5 / the trigram tokenizer fall
+                # back to the plain icontains search at query time.
+                if vendor != 'sqlite':
+                    raise
+                return
+    return run
+
+
+class Migration(migrations.Migration):
+    """
+    Search infrastructure that lives outside the Django model:
+      - PostgreSQL: generated tsvector column with a GIN index, and
+        pg_trgm GIN indexes on name and vaccine_type for typo tolerance.
+      - SQLite: external-content FTS5 table kept in sync by triggers.
+    Queried by campaigns.search.CampaignSearchFilter.
+    """
+
+    dependencies = [
+        ('campaigns', '0007_vaccineschedule_campaign_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor(POSTGRES_FORWARD, SQLITE_FORWARD),
+            run_for_vendor(POSTGRES_REVERSE, SQLITE_REVERSE),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0008_campaign_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vaccineschedule',
+            name='schedule_campaign_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='vaccineschedule',
+            index=models.Index(fields=['campaign', 'date', 'start_time'], name='schedule_campaign_slot_idx'),
+        ),
+    ]
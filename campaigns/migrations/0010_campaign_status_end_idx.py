@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0009_schedule_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vaccinecampaign',
+            index=models.Index(fields=['status', 'end_date'], name='campaign_status_end_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:23
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Adding a NOT NULL column makes SQLite rebuild the table, which drops the
+# FTS triggers created in 0008_campaign_search.
+SQLITE_FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS campaigns_vaccinecampaign_fts_ai AFTER INSERT ON campaigns_vaccinecampaign BEGIN
+        INSERT INTO campaigns_vaccinecampaign_fts(rowid, name, vaccine_type, location, description)
+        VALUES (new.id, new.name, new.vaccine_type, new.location, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS campaigns_vaccinecampaign_fts_ad AFTER DELETE ON campaigns_vaccinecampaign BEGIN
+        INSERT INTO campaigns_vaccinecampaign_fts(campaigns_vaccinecampaign_fts, rowid, name, vaccine_type, location, description)
+        VALUES ('delete', old.id, old.name, old.vaccine_type, old.location, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS campaigns_vaccinecampaign_fts_au AFTER UPDATE ON campaigns_vaccinecampaign BEGIN
+        INSERT INTO campaigns_vaccinecampaign_fts(campaigns_vaccinecampaign_fts, rowid, name, vaccine_type, location, description)
+        VALUES ('delete', old.id, old.name, old.vaccine_type, old.location, old.description);
+        INSERT INTO campaigns_vaccinecampaign_fts(rowid, name, vaccine_type, location, description)
+        VALUES (new.id, new.name, new.vaccine_type, new.location, new.description);
+    END
+    """,
+]
+
+
+def restore_sqlite_fts_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    if 'campaigns_vaccinecampaign_fts' not in connection.introspection.table_names():
+        return
+    for sql in SQLITE_FTS_TRIGGERS:
+        schema_editor.execute(sql)
+
+
+def backfill_participant_counts(apps, schema_editor):
+    VaccineCampaign = apps.get_model('campaigns', 'VaccineCampaign')
+    VaccineRecord = apps.get_model('bookings', 'VaccineRecord')
+    counts = VaccineRecord.objects.values('campaign').annotate(n=Count('id')).values_list('campaign', 'n')
+    for campaign_id, count in counts:
+        VaccineCampaign.objects.filter(pk=campaign_id).update(participant_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0011_vaccinecampaign_coordinates'),
+        ('bookings', '0010_alter_campaignreview_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vaccinecampaign',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(restore_sqlite_fts_triggers, migrations.RunPython.noop),
+        migrations.RunPython(backfill_participant_counts, migrations.RunPython.noop),
+    ]
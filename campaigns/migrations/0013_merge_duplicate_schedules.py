@@ -0,0 +1,42 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_schedules(apps, schema_editor):
+    """
+    Fold schedules sharing a (campaign, date, start_time, end_time) window
+    into the oldest one, so the unique constraint added in 0014 can be
+    created. Slots are summed and bookings and payments are repointed.
+    """
+    VaccineSchedule = apps.get_model('campaigns', 'VaccineSchedule')
+    VaccineRecord = apps.get_model('bookings', 'VaccineRecord')
+    Payment = apps.get_model('bookings', 'Payment')
+
+    duplicates = VaccineSchedule.objects.values(
+        'campaign', 'date', 'start_time', 'end_time'
+    ).annotate(n=Count('id'), keep=Min('id'), slots=Sum('available_slots')).filter(n__gt=1)
+
+    for window in duplicates:
+        others = list(VaccineSchedule.objects.filter(
+            campaign=window['campaign'],
+            date=window['date'],
+            start_time=window['start_time'],
+            end_time=window['end_time'],
+        ).exclude(pk=window['keep']).values_list('pk', flat=True))
+        VaccineRecord.objects.filter(first_dose_schedule__in=others).update(first_dose_schedule=window['keep'])
+        VaccineRecord.objects.filter(second_dose_schedule__in=others).update(second_dose_schedule=window['keep'])
+        Payment.objects.filter(schedule_id__in=others).update(schedule_id=window['keep'])
+        VaccineSchedule.objects.filter(pk=window['keep']).update(available_slots=window['slots'])
+        VaccineSchedule.objects.filter(pk__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0012_vaccinecampaign_participant_count'),
+        ('bookings', '0010_alter_campaignreview_unique_together'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_schedules, migrations.RunPython.noop),
+    ]
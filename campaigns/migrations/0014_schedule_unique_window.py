@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0013_merge_duplicate_schedules'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='vaccineschedule',
+            constraint=models.UniqueConstraint(fields=('campaign', 'date', 'start_time', 'end_time'), name='schedule_unique_window'),
+        ),
+    ]
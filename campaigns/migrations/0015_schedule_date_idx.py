@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 23:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('campaigns', '0014_schedule_unique_window'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vaccineschedule',
+            index=models.Index(fields=['date'], name='schedule_date_idx'),
+        ),
+    ]
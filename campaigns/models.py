@@ -1,6 +1,9 @@
 from django.db import models
+from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
 from cloudinary.models import CloudinaryField
+from .managers import VaccineCampaignQuerySet
+from . import geo
 
 class VaccineCampaign(models.Model):
     ACTIVE = 'ACTIVE'
@@ -20,15 +23,44 @@ class VaccineCampaign(models.Model):
     campaign_image = CloudinaryField( blank=True, default='vaxCamp_tqt2sl')
     vaccine_type = models.CharField(max_length=100)
     location = models.CharField(max_length=255, blank=True, null=True)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    geohash = models.CharField(max_length=12, null=True, blank=True, editable=False, db_index=True)
     start_date = models.DateField()
     end_date = models.DateField()
     dosage_interval_days = models.PositiveIntegerField(default=28)
     max_participants = models.PositiveIntegerField()
+    participant_count = models.PositiveIntegerField(default=0, editable=False)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=UPCOMING)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = VaccineCampaignQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'end_date'], name='campaign_status_end_idx'),
+        ]
     
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = geo.encode(self.latitude, self.longitude)
+        else:
+            self.geohash = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        elif update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # participant_count only changes through the conditional UPDATEs in
+            # campaigns.inventory; a full save must not write a stale copy back
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'participant_count' and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.name} ({self.vaccine_type}) - {self.status}"
 
@@ -44,6 +76,14 @@ class VaccineSchedule(models.Model):
     
     class Meta:
         ordering = ['date', 'start_time']
+        indexes = [
+            models.Index(fields=['campaign', 'date', 'start_time'], name='schedule_campaign_slot_idx'),
+            # The dose reminders look up a day's schedules across campaigns
+            models.Index(fields=['date'], name='schedule_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'date', 'start_time', 'end_time'], name='schedule_unique_window'),
+        ]
     
     def __str__(self):
         return f"Schedule {self.id} on {self.date}"
\ No newline at end of file
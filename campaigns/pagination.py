@@ -1,4 +1,187 @@
-from rest_framework.pagination import PageNumberPagination
+import binascii
+import datetime
+import json
+from base64 import b64decode, b64encode
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    Row estimate from the PostgreSQL planner, which costs no table scan.
+    Other databases fall back to an exact COUNT(*).
+    """
+    if connections[queryset.db].vendor != 'postgresql':
+        return queryset.count()
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Keyset pagination over the view's `keyset_ordering`, so a page costs the
+    same at any depth. The cursor carries the full ordering tuple of the
+    boundary row, and pages seek with the row comparison
+    (a, b, id) > (x, y, z), spelled out per column and direction, which the
+    ordering's composite index answers directly. The last ordering field
+    must be unique and none may be NULL. Totals are opt-in with
+    ?count=exact or ?count=estimate, unless the view's `known_count()`
+    returns one for free.
+
+    Filter backends marked `ranked` order by relevance, which a keyset
+    cannot follow, so cursor pages are refused while they search.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+    search_message = "Cursor pagination cannot be combined with search; search results are paged by number."
+
+    @classmethod
+    def requested(cls, request):
+        params = request.query_params
+        return cls.cursor_query_param in params or params.get('pagination') == 'cursor'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'keyset_ordering', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.check_not_searching(request, view)
+        self.count = self.get_count(queryset, request, view)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = tuple(_invert(field) for field in self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(_seek(ordering, self.cursor.position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, following
+        else:
+            self.has_next, self.has_previous = following, self.cursor is not None
+        if (self.has_next or self.has_previous) and self.template is not None:
+            # The browsable API shows the next/previous controls
+            self.display_page_controls = True
+        return self.page
+
+    def check_not_searching(self, request, view):
+        for backend in getattr(view, 'filter_backends', []):
+            if getattr(backend, 'ranked', False) and backend().get_search_terms(request):
+                raise ValidationError({'pagination': self.search_message})
+
+    def get_count(self, queryset, request, view=None):
+        # Views that maintain their own totals report them without a COUNT
+        known = getattr(view, 'known_count', None)
+        if known is not None:
+            count = known()
+            if count is not None:
+                return count
+        mode = request.query_params.get('count')
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return estimate_count(queryset)
+        return None
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self._position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Nothing left past the cursor; start again from the first page
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self._position(self.page[0])))
+
+    def _position(self, instance):
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def encode_cursor(self, cursor):
+        payload = {'p': [_encode_value(value) for value in cursor.position]}
+        if cursor.reverse:
+            payload['r'] = 1
+        token = b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if token is None:
+            return None
+        try:
+            payload = json.loads(b64decode(token.encode()).decode())
+            position = payload['p']
+            reverse = bool(payload.get('r'))
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data = {'count': self.count, **response.data}
+        return response
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _seek(ordering, position):
+    """Rows after `position` in `ordering`: the tuple comparison as an OR of column prefixes."""
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    return condition
+
+
+def _encode_value(value):
+    # Full precision: DjangoJSONEncoder would cut datetimes to milliseconds
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
 
 class DefaultPagination(PageNumberPagination):
-    page_size = 10
\ No newline at end of file
+    """
+    Page-number pagination that switches to KeysetPagination when the client
+    sends ?pagination=cursor or follows a cursor link.
+    """
+    page_size = 10
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.requested(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,95 @@
+import re
+from functools import lru_cache
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+SQLITE_FTS_TABLE = 'campaigns_vaccinecampaign_fts'
+
+
+@lru_cache(maxsize=None)
+def sqlite_fts_available(alias):
+    return SQLITE_FTS_TABLE in connections[alias].introspection.table_names()
+
+
+def trigram_match_query(terms):
+    """
+    Build an FTS5 query for the trigram tokenizer that tolerates typos.
+
+    Each term is split into overlapping fragments (3 characters for short
+    words, 4 for longer ones) and matches when any fragment does, so a single
+    typo still leaves matching fragments. Every term must match, and bm25
+    ranks rows sharing more fragments first.
+    """
+    clauses = []
+    for term in terms:
+        term = re.sub(r'[^\w]', '', term.lower())
+        if len(term) < 3:
+            # The trigram tokenizer cannot match anything shorter
+            continue
+        size = 3 if len(term) <= 5 else 4
+        if len(term) <= size:
+            clauses.append(f'"{term}"')
+            continue
+        fragments = sorted({term[i:i + size] for i in range(len(term) - size + 1)})
+        clauses.append('(' + ' OR '.join(f'"{f}"' for f in fragments) + ')')
+    return ' AND '.join(clauses)
+
+
+class CampaignSearchFilter(SearchFilter):
+    """
+    Ranked, typo-tolerant campaign search behind the usual ?search= param.
+
+    PostgreSQL matches the generated search_vector column and falls back to
+    pg_trgm word similarity on name and vaccine_type; SQLite uses the FTS5
+    trigram table. Both are created by migration 0008_campaign_search. Any
+    other database keeps DRF's icontains search over view.search_fields.
+    """
+    # Results are ordered by relevance, so KeysetPagination refuses to page them
+    ranked = True
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            return self.postgres_search(queryset, ' '.join(terms))
+        if connection.vendor == 'sqlite' and sqlite_fts_available(queryset.db):
+            query = trigram_match_query(terms)
+            if query:
+                return self.sqlite_search(queryset, query)
+        return super().filter_queryset(request, queryset, view)
+
+    def postgres_search(self, queryset, text):
+        table = queryset.model._meta.db_table
+        match = RawSQL(
+            f"({table}.search_vector @@ websearch_to_tsquery('english', %s)"
+            f" OR %s <%% {table}.name OR %s <%% {table}.vaccine_type)",
+            (text, text, text),
+            output_field=BooleanField()
+        )
+        rank = RawSQL(
+            f"ts_rank({table}.search_vector, websearch_to_tsquery('english', %s))"
+            f" + word_similarity(%s, {table}.name)",
+            (text, text),
+            output_field=FloatField()
+        )
+        return queryset.annotate(search_match=match, search_rank=rank).filter(
+            search_match=True
+        ).order_by('-search_rank', '-id')
+
+    def sqlite_search(self, queryset, query):
+        # Join the FTS table so MATCH runs once; its hidden rank column is bm25
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[SQLITE_FTS_TABLE],
+            where=[
+                f"{SQLITE_FTS_TABLE}.rowid = {table}.id",
+                f"{SQLITE_FTS_TABLE} MATCH %s",
+            ],
+            params=[query],
+            select={'search_rank': f"-{SQLITE_FTS_TABLE}.rank"},
+        ).order_by('-search_rank', '-id')
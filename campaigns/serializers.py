@@ -1,7 +1,9 @@
 from rest_framework import serializers
 from .models import VaccineCampaign, VaccineSchedule
 from django.utils import timezone
-from bookings.models import VaccineRecord
+from datetime import timedelta
+from django.core.exceptions import ObjectDoesNotExist
+from bookings.models import VaccineRecord, WaitlistEntry, CampaignRatingSummary
 
 
 class VaccineScheduleSerializer(serializers.ModelSerializer):
@@ -11,7 +13,10 @@ class VaccineScheduleSerializer(serializers.ModelSerializer):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        
+        if self.read_only:
+            # Nested read-only use never validates the campaign field
+            return
+
         campaign = self.context.get('campaign')
         if campaign:
             self.fields['campaign'].queryset = VaccineCampaign.objects.filter(pk=campaign.pk)
@@ -22,21 +27,183 @@ class VaccineCampaignSerializer(serializers.ModelSerializer):
     schedules = VaccineScheduleSerializer(many=True, read_only=True)
     created_by = serializers.StringRelatedField()
     campaign_image = serializers.ImageField(required=False)
+    rating_summary = serializers.SerializerMethodField()
 
     class Meta:
         model = VaccineCampaign
         fields = [
-            'id', 'name','campaign_image','description','is_premium', 'premium_price','vaccine_type','location', 'start_date','end_date','schedules', 'dosage_interval_days', 'max_participants',
-              'created_by','status','created_at','updated_at'
+            'id', 'name','campaign_image','description','is_premium', 'premium_price','vaccine_type','location', 'latitude', 'longitude', 'start_date','end_date','schedules', 'dosage_interval_days', 'max_participants', 'participant_count',
+              'rating_summary', 'created_by','status','created_at','updated_at'
         ]
         read_only_fields = ['created_by']
     
+    def get_rating_summary(self, obj):
+        # Joined in by VaccineCampaignViewSet's select_related('rating_summary')
+        try:
+            summary = obj.rating_summary
+        except ObjectDoesNotExist:
+            summary = CampaignRatingSummary(campaign_id=obj.pk)
+        return {'review_count': summary.review_count, 'average': summary.average, 'histogram': summary.histogram}
+
     def validate(self, data):
         if data['start_date'] > data['end_date']:
             raise serializers.ValidationError("End date must be after start date")
+        latitude = data.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = data.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError("Latitude and longitude must be provided together")
         return data
 
 
+class VaccineCampaignSummarySerializer(VaccineCampaignSerializer):
+    """
+    List representation without nested schedules. The availability fields
+    are annotated in SQL by VaccineCampaignViewSet.get_queryset.
+    """
+    upcoming_schedule_count = serializers.IntegerField(read_only=True)
+    remaining_slots = serializers.IntegerField(read_only=True)
+    next_available_date = serializers.DateField(read_only=True)
+
+    class Meta(VaccineCampaignSerializer.Meta):
+        fields = [
+            'id', 'name','campaign_image','description','is_premium', 'premium_price','vaccine_type','location', 'latitude', 'longitude', 'start_date','end_date', 'dosage_interval_days', 'max_participants', 'participant_count',
+              'upcoming_schedule_count', 'remaining_slots', 'next_available_date',
+              'rating_summary', 'created_by','status','created_at','updated_at'
+        ]
+
+
+
+class ScheduleWindowSerializer(serializers.Serializer):
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+
+    def validate(self, attrs):
+        if attrs['start_time'] >= attrs['end_time']:
+            raise serializers.ValidationError("Window end time must be after start time.")
+        return attrs
+
+
+class ScheduleGenerationSerializer(serializers.Serializer):
+    """
+    Recurrence spec for:
+      POST /api/campaigns/{id}/generate-schedules/
+    Accepts:
+      - weekdays (required; 0 = Monday ... 6 = Sunday)
+      - windows (required; list of {start_time, end_time})
+      - slots_per_window (required)
+      - start_date / end_date (optional; clamped to the campaign range)
+      - dry_run (optional; preview without saving)
+    """
+    MAX_SCHEDULES = 10000
+
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6),
+        allow_empty=False
+    )
+    windows = ScheduleWindowSerializer(many=True, allow_empty=False)
+    slots_per_window = serializers.IntegerField(min_value=1)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        campaign = self.context['campaign']
+        start_date = max(attrs.get('start_date') or campaign.start_date, campaign.start_date)
+        end_date = min(attrs.get('end_date') or campaign.end_date, campaign.end_date)
+
+        if start_date > end_date:
+            raise serializers.ValidationError("Date range does not overlap the campaign dates.")
+
+        matching_days = self._count_days(start_date, end_date, attrs['weekdays'])
+        if matching_days * len(attrs['windows']) > self.MAX_SCHEDULES:
+            raise serializers.ValidationError(f"A single request can generate at most {self.MAX_SCHEDULES} schedules.")
+
+        attrs['start_date'] = start_date
+        attrs['end_date'] = end_date
+        return attrs
+
+    @staticmethod
+    def _count_days(start_date, end_date, weekdays):
+        weekdays = set(weekdays)
+        return sum(
+            1 for offset in range((end_date - start_date).days + 1)
+            if (start_date + timedelta(days=offset)).weekday() in weekdays
+        )
+
+    def build_schedules(self):
+        """
+        Return unsaved VaccineSchedule rows for the recurrence, leaving out
+        windows that already exist for the campaign, and the number left out.
+        Existing schedules are fetched with a single query.
+        """
+        data = self.validated_data
+        campaign = self.context['campaign']
+        weekdays = set(data['weekdays'])
+        windows = sorted(
+            {(w['start_time'], w['end_time']) for w in data['windows']}
+        )
+
+        existing = set(
+            VaccineSchedule.objects.filter(
+                campaign=campaign,
+                date__range=(data['start_date'], data['end_date'])
+            ).values_list('date', 'start_time', 'end_time')
+        )
+
+        schedules = []
+        skipped = 0
+        day = data['start_date']
+        while day <= data['end_date']:
+            if day.weekday() in weekdays:
+                for start_time, end_time in windows:
+                    if (day, start_time, end_time) in existing:
+                        skipped += 1
+                        continue
+                    schedules.append(VaccineSchedule(
+                        campaign=campaign,
+                        date=day,
+                        available_slots=data['slots_per_window'],
+                        start_time=start_time,
+                        end_time=end_time
+                    ))
+            day += timedelta(days=1)
+        return schedules, skipped
+
+
+class NearbyCampaignSerializer(VaccineCampaignSummarySerializer):
+    distance_km = serializers.SerializerMethodField()
+
+    class Meta(VaccineCampaignSummarySerializer.Meta):
+        fields = VaccineCampaignSummarySerializer.Meta.fields + ['distance_km']
+
+    def get_distance_km(self, obj):
+        return round(self.context['distances'][obj.pk], 3)
+
+
+class NearbyQuerySerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(min_value=0.1, max_value=500, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    MAX_DAYS = 366
+
+    campaign = serializers.IntegerField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        today = timezone.localdate()
+        attrs.setdefault('date_to', today)
+        attrs.setdefault('date_from', attrs['date_to'] - timedelta(days=29))
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to.")
+        if (attrs['date_to'] - attrs['date_from']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"The range can cover at most {self.MAX_DAYS} days.")
+        return attrs
+
 
 class CampaignBookingSerializer(serializers.Serializer):
     """
@@ -89,7 +256,52 @@ class CampaignBookingSerializer(serializers.Serializer):
         if schedule.available_slots <= 0:
             raise serializers.ValidationError("No available slots for this schedule.")
 
+        if campaign.participant_count >= campaign.max_participants:
+            raise serializers.ValidationError("This campaign has reached its participant limit.")
+
         if VaccineRecord.objects.filter(patient=request.user, campaign=campaign).exists():
             raise serializers.ValidationError("You already have a booking for this campaign.")
 
-        return attrs
\ No newline at end of file
+        return attrs
+
+class WaitlistJoinSerializer(serializers.Serializer):
+    """
+    Join the waitlist of a full schedule via:
+      POST /api/campaigns/{id}/waitlist/
+    """
+    first_dose_schedule_id = serializers.PrimaryKeyRelatedField(
+        queryset=VaccineSchedule.objects.none(),
+        write_only=True,
+        source='first_dose_schedule'
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        campaign = self.context.get('campaign')
+        if campaign:
+            self.fields['first_dose_schedule_id'].queryset = VaccineSchedule.objects.filter(
+                campaign=campaign,
+                date__gte=timezone.now().date()
+            )
+
+    def validate(self, attrs):
+        request = self.context['request']
+        campaign = self.context['campaign']
+        schedule = attrs['first_dose_schedule']
+
+        if campaign.status not in [VaccineCampaign.ACTIVE, VaccineCampaign.UPCOMING]:
+            raise serializers.ValidationError("This campaign is not open for booking.")
+
+        if campaign.is_premium:
+            raise serializers.ValidationError("Premium campaigns do not have a waitlist.")
+
+        if schedule.available_slots > 0:
+            raise serializers.ValidationError("This schedule still has free slots; book it directly.")
+
+        if VaccineRecord.objects.filter(patient=request.user, campaign=campaign).exists():
+            raise serializers.ValidationError("You already have a booking for this campaign.")
+
+        if WaitlistEntry.objects.filter(patient=request.user, schedule=schedule).exists():
+            raise serializers.ValidationError("You are already on the waitlist for this schedule.")
+
+        return attrs
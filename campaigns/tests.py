@@ -1,3 +1,190 @@
+import json
+import random
+from base64 import b64decode
+from datetime import time, timedelta
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+from django.db.models import F
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import User
+from . import availability, geo
+from .models import VaccineCampaign, VaccineSchedule
 
-# Create your tests here.
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        doctor = User.objects.create_user(email='doctor@example.com', nid='0000000001', role=User.Role.DOCTOR, password='test')
+        today = timezone.localdate()
+        self.campaign = VaccineCampaign.objects.create(
+            name='Test campaign', description='Campaign used by the pagination tests', vaccine_type='Flu',
+            start_date=today, end_date=today + timedelta(days=60), max_participants=100,
+            created_by=doctor, status=VaccineCampaign.ACTIVE,
+        )
+        # Several windows a day, so pages have to seek inside a date
+        for day in range(1, 4):
+            for hour in (14, 9, 11, 16):
+                VaccineSchedule.objects.create(
+                    campaign=self.campaign, date=today + timedelta(days=day),
+                    start_time=time(hour), end_time=time(hour + 1), available_slots=5,
+                )
+        self.expected = list(
+            VaccineSchedule.objects.order_by('date', 'start_time', 'id').values_list('id', flat=True)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(doctor)
+        self.url = f'/api/v1/campaigns/{self.campaign.id}/schedule/'
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_pages_follow_the_full_ordering(self):
+        seen = []
+        pages = []
+        data = self.get(self.url, pagination='cursor', page_size=3)
+        while True:
+            pages.append(data)
+            seen += [row['id'] for row in data['results']]
+            if not data['next']:
+                break
+            data = self.get(data['next'])
+        self.assertEqual(seen, self.expected)
+
+        cursor = parse_qs(urlparse(pages[1]['next']).query)['cursor'][0]
+        position = json.loads(b64decode(cursor))['p']
+        self.assertEqual(len(position), 3)
+
+        # And back again through the previous links
+        back = []
+        data = pages[-1]
+        while data['previous']:
+            data = self.get(data['previous'])
+            back = [row['id'] for row in data['results']] + back
+        self.assertEqual(back, self.expected[:len(back)])
+        self.assertEqual(len(back) + len(pages[-1]['results']), len(self.expected))
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(self.url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_is_refused_with_a_search(self):
+        response = self.client.get('/api/v1/campaigns/', {'search': 'flu', 'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 400, response.content)
+        response = self.client.get('/api/v1/campaigns/', {'search': 'flu'})
+        self.assertEqual(response.status_code, 200, response.content)
+
+
+class NearbyTests(TestCase):
+    def setUp(self):
+        self.doctor = User.objects.create_user(email='doctor@example.com', nid='0000000001', role=User.Role.DOCTOR, password='test')
+        self.rng = random.Random(9)
+
+    def seed(self, latitude, longitude, spread, count=300):
+        today = timezone.localdate()
+        campaigns = []
+        for i in range(count):
+            lat = max(-89.9, min(89.9, latitude + self.rng.uniform(-spread, spread)))
+            lng = (longitude + self.rng.uniform(-2 * spread, 2 * spread) + 180) % 360 - 180
+            campaigns.append(VaccineCampaign(
+                name=f"Campaign {i}", description='Nearby test campaign', vaccine_type='Flu',
+                latitude=lat, longitude=lng, geohash=geo.encode(lat, lng),
+                start_date=today, end_date=today + timedelta(days=30), max_participants=10,
+                created_by=self.doctor,
+            ))
+        VaccineCampaign.objects.bulk_create(campaigns)
+
+    def brute_force(self, latitude, longitude, radius_km, limit):
+        hits = sorted(
+            (geo.haversine_km(latitude, longitude, lat, lng), pk)
+            for pk, lat, lng in VaccineCampaign.objects.values_list('pk', 'latitude', 'longitude')
+        )
+        return [hit for hit in hits if hit[0] <= radius_km][:limit]
+
+    def assertSameHits(self, latitude, longitude, radius_km, limit):
+        expected = self.brute_force(latitude, longitude, radius_km, limit)
+        hits = geo.within_radius(VaccineCampaign.objects.all(), latitude, longitude, radius_km, limit)
+        self.assertEqual([pk for _, pk in hits], [pk for _, pk in expected], (latitude, longitude, radius_km))
+
+    def test_within_radius_matches_brute_force_at_high_latitudes(self):
+        for latitude in (60, -60, 75):
+            VaccineCampaign.objects.all().delete()
+            self.seed(latitude, 25, 6)
+            for _ in range(15):
+                lat, lng = latitude + self.rng.uniform(-2, 2), 25 + self.rng.uniform(-4, 4)
+                self.assertSameHits(lat, lng, 500, 10)
+                self.assertSameHits(lat, lng, 500, 1000)
+                self.assertSameHits(lat, lng, 120, 10)
+
+    def test_within_radius_matches_brute_force_at_random_latitudes(self):
+        self.seed(0, 0, 60, count=600)
+        for _ in range(40):
+            lat, lng = self.rng.uniform(-60, 60), self.rng.uniform(-60, 60)
+            self.assertSameHits(lat, lng, self.rng.choice([50, 200, 500]), 10)
+
+    def test_across_the_antimeridian_and_near_a_pole(self):
+        self.seed(65, 179, 3)
+        self.seed(88, 0, 1.5)
+        for lat, lng in [(65, 179.5), (65, -179.5), (89.5, 40), (88, -100)]:
+            self.assertSameHits(lat, lng, 300, 10)
+
+    def test_nearest_without_a_radius(self):
+        self.seed(60, 25, 6)
+        for _ in range(10):
+            lat, lng = 60 + self.rng.uniform(-3, 3), 25 + self.rng.uniform(-6, 6)
+            expected = self.brute_force(lat, lng, geo.MAX_SEARCH_RADIUS_KM, 10)
+            hits = geo.nearest(VaccineCampaign.objects.all(), lat, lng, 10)
+            self.assertEqual([pk for _, pk in hits], [pk for _, pk in expected])
+
+
+class AvailabilityCacheTests(TestCase):
+    def setUp(self):
+        doctor = User.objects.create_user(email='doctor@example.com', nid='0000000001', role=User.Role.DOCTOR, password='test')
+        patient = User.objects.create_user(email='patient@example.com', nid='0000000002', role=User.Role.PATIENT, password='test')
+        today = timezone.localdate()
+        self.campaign = VaccineCampaign.objects.create(
+            name='Test campaign', description='Campaign used by the availability tests', vaccine_type='Flu',
+            start_date=today, end_date=today + timedelta(days=60), max_participants=100,
+            created_by=doctor, status=VaccineCampaign.ACTIVE,
+        )
+        self.schedule = VaccineSchedule.objects.create(
+            campaign=self.campaign, date=today + timedelta(days=1),
+            start_time=time(9), end_time=time(10), available_slots=5,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(patient)
+        self.url = f'/api/v1/campaigns/{self.campaign.id}/booking/'
+        self.cache = availability.get_cache()
+        self.cache.clear()
+
+    def book(self):
+        # A booking whose on-commit adjustment runs while the counter is missing
+        VaccineSchedule.objects.filter(pk=self.schedule.pk).update(available_slots=F('available_slots') - 1)
+        availability.adjust_slots(self.schedule.pk, -1)
+
+    def slots(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response['X-Cache'], [row['available_slots'] for row in response.data]
+
+    def test_booking_during_a_rebuild_is_not_lost(self):
+        add = self.cache.add
+
+        def add_after_booking(key, value, *args, **kwargs):
+            if key == availability.SLOTS_KEY.format(self.schedule.pk):
+                self.book()
+            return add(key, value, *args, **kwargs)
+
+        with mock.patch.object(self.cache, 'add', side_effect=add_after_booking):
+            self.assertEqual(self.slots(), ('MISS', [5]))
+
+        # The stale count was dropped, so the next read rebuilds it
+        self.assertEqual(self.slots(), ('MISS', [4]))
+        self.assertEqual(self.slots(), ('HIT', [4]))
+
+    def test_bookings_adjust_a_cached_counter(self):
+        self.assertEqual(self.slots(), ('MISS', [5]))
+        self.book()
+        self.assertEqual(self.slots(), ('HIT', [4]))
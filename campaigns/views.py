@@ -3,41 +3,61 @@ from rest_framework import status
 from rest_framework.response import Response
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import F
+from django.db.models import Count, Sum, Min, Q, Prefetch
+from django.db.models.functions import Coalesce
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.permissions import IsAuthenticated
-from .serializers import VaccineCampaignSerializer, VaccineScheduleSerializer, CampaignBookingSerializer
+from .serializers import VaccineCampaignSerializer, VaccineCampaignSummarySerializer, VaccineScheduleSerializer, CampaignBookingSerializer, ScheduleGenerationSerializer, NearbyCampaignSerializer, NearbyQuerySerializer, WaitlistJoinSerializer, AnalyticsQuerySerializer
 from users.permissions import IsDoctor,IsPatient
 from .models import VaccineCampaign,VaccineSchedule
+from .inventory import claim_slot, claim_participant, release_participant
+from . import availability, geo
 from rest_framework.exceptions import PermissionDenied
 from users.models import User
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.filters import SearchFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from campaigns.pagination import DefaultPagination
+from campaigns.search import CampaignSearchFilter
+from campaigns.conditional import ConditionalGetMixin
 from bookings.serializers import VaccineRecordSerializer
-from bookings.models import VaccineRecord,Payment
-
-
-class VaccineCampaignViewSet(ModelViewSet):
-    queryset = VaccineCampaign.objects.select_related('created_by').prefetch_related(
-        'schedules',
-    )
+from bookings.models import VaccineRecord,WaitlistEntry
+from bookings.allocation import claim_second_doses, plan_second_doses
+from bookings.bulk import book_in_bulk, BulkBookingError
+from bookings.serializers import BulkBookingSerializer, WaitlistEntrySerializer, ScheduleCancellationSerializer
+from bookings.waitlist import cancel_bookings
+from bookings.idempotency import idempotent
+from bookings.queue import enqueue
+from bookings.holds import active_hold, create_hold, HoldUnavailable
+from bookings import rollups
+from django.urls import reverse
+
+
+class VaccineCampaignViewSet(ConditionalGetMixin, ModelViewSet):
+    queryset = VaccineCampaign.objects.select_related('created_by', 'rating_summary')
     serializer_class = VaccineCampaignSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend,SearchFilter]
+    filter_backends = [DjangoFilterBackend,CampaignSearchFilter]
     filterset_fields = ['status']
     pagination_class = DefaultPagination
+    keyset_ordering = ('-id',)
     search_fields = ['name', 'description', 'location','vaccine_type']
+    conditional_timestamps = ['updated_at', 'schedules__updated_at', 'rating_summary__updated_at']
+    conditional_counts = ['id', 'schedules']
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy', 'add_schedule']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'add_schedule', 'generate_schedules', 'import_bookings', 'analytics']:
             return [IsAuthenticated(), IsDoctor()]
         return [IsAuthenticated()]
 
     def get_queryset(self):
+        return self.with_schedules(self.get_conditional_queryset())
+
+    def get_conditional_queryset(self):
+        # Campaigns visible to the user, without list annotations or prefetches
         if getattr(self, 'swagger_fake_view', False):
             return self.queryset.none()
         user = self.request.user
@@ -48,6 +68,42 @@ class VaccineCampaignViewSet(ModelViewSet):
             return qs
         return qs.none()
 
+    @property
+    def expand_schedules(self):
+        params = getattr(self.request, 'query_params', {})
+        return 'schedules' in params.get('expand', '').split(',')
+
+    def with_schedules(self, qs):
+        """
+        List and nearby pages carry SQL aggregates instead of nested schedules, unless
+        ?expand=schedules asks for the future schedules themselves. Detail
+        responses keep the full schedule list.
+        """
+        today = timezone.now().date()
+        if self.action == 'list' and self.expand_schedules:
+            return qs.prefetch_related(Prefetch(
+                'schedules',
+                queryset=VaccineSchedule.objects.filter(date__gte=today)
+            ))
+        if self.action in ['list', 'nearby']:
+            upcoming = Q(schedules__date__gte=today)
+            return qs.annotate(
+                upcoming_schedule_count=Count('schedules', filter=upcoming),
+                remaining_slots=Coalesce(Sum('schedules__available_slots', filter=upcoming), 0),
+                next_available_date=Min(
+                    'schedules__date',
+                    filter=upcoming & Q(schedules__available_slots__gt=0)
+                ),
+            )
+        if self.action in ['retrieve', 'update', 'partial_update']:
+            return qs.prefetch_related('schedules')
+        return qs
+
+    def get_serializer_class(self):
+        if self.action == 'list' and not self.expand_schedules:
+            return VaccineCampaignSummarySerializer
+        return super().get_serializer_class()
+
     def perform_create(self, serializer):
         if self.request.user.role != User.Role.DOCTOR:
             raise PermissionDenied("Only doctors can create campaigns")
@@ -56,7 +112,9 @@ class VaccineCampaignViewSet(ModelViewSet):
     def perform_update(self, serializer):
         if self.request.user.role != User.Role.DOCTOR:
             raise PermissionDenied("Only doctors can update campaigns")
-        serializer.save()
+        campaign = serializer.save()
+        # The save leaves the counter alone; answer with its current value
+        campaign.refresh_from_db(fields=['participant_count'])
 
     def perform_destroy(self, instance):
         if self.request.user.role != User.Role.DOCTOR:
@@ -65,8 +123,9 @@ class VaccineCampaignViewSet(ModelViewSet):
 
     @swagger_auto_schema(
         operation_summary="List Vaccine Campaigns",
-        operation_description="Retrieve a list of all vaccine campaigns available to the user",
-        responses={200: VaccineCampaignSerializer(many=True)}
+        operation_description="Retrieve a list of all vaccine campaigns available to the user with aggregated "
+                              "availability. Pass ?expand=schedules to include upcoming schedules instead.",
+        responses={200: VaccineCampaignSummarySerializer(many=True)}
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
@@ -116,80 +175,262 @@ class VaccineCampaignViewSet(ModelViewSet):
 
     
     @action(detail=True, methods=['get', 'post'],permission_classes=[IsAuthenticated], url_path='booking', serializer_class=CampaignBookingSerializer)
+    @idempotent
     def booking(self, request, pk=None):
         campaign = self.get_object()
 
         if request.method == 'GET':
-            schedules = campaign.schedules.filter(
-                date__gte=timezone.now().date(),
-                available_slots__gt=0
-            ).order_by('date', 'start_time')
-            serializer = VaccineScheduleSerializer(
-                schedules, many=True, context={'request': request}
-            )
-            return Response(serializer.data)
+            def build():
+                schedules = campaign.schedules.filter(
+                    date__gte=timezone.now().date()
+                ).order_by('date', 'start_time')
+                return VaccineScheduleSerializer(
+                    schedules, many=True, context={'request': request}
+                ).data
+
+            data, cached = availability.get_availability(campaign.id, build)
+            return Response(data, headers={'X-Cache': 'HIT' if cached else 'MISS'})
 
         # POST → create booking or payment
         if not IsPatient().has_permission(request, self):
             raise PermissionDenied("Only patients can create a booking.")
 
-        serializer = CampaignBookingSerializer(
+        # Premium → a patient still holding a slot gets the same payment back
+        payment = active_hold(request.user, campaign) if campaign.is_premium else None
+        if payment is None:
+            serializer = CampaignBookingSerializer(
+                data=request.data,
+                context={'request': request, 'campaign': campaign}
+            )
+            serializer.is_valid(raise_exception=True)
+            first_schedule = serializer.validated_data['first_dose_schedule']
+
+        # Premium → create Payment first (no booking yet). The payment holds
+        # the slot until it succeeds, fails or its hold expires.
+        if campaign.is_premium:
+            if payment is None:
+                try:
+                    payment = create_hold(request.user, campaign, first_schedule)
+                except HoldUnavailable as e:
+                    return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response({
+                "message": "Payment required",
+                "payment_id": payment.id,
+                "amount": payment.amount,
+                "campaign_id": campaign.id,
+                "schedule_id": payment.schedule_id,
+                "hold_expires_at": payment.hold_expires_at
+            }, status=status.HTTP_200_OK)
+
+        # Queued mode → accept now, process_booking_queue books it in a batch
+        if request.query_params.get('mode') == 'queued':
+            booking_request, _ = enqueue(request.user, campaign, first_schedule)
+            return Response({
+                "ticket": booking_request.ticket,
+                "status": booking_request.status,
+                "status_url": request.build_absolute_uri(
+                    reverse('bookings-booking-request', kwargs={'ticket': booking_request.ticket})
+                )
+            }, status=status.HTTP_202_ACCEPTED)
+
+        # Non-premium → claim a participant place, then resolve the
+        # second-dose window, claim both slots and create the record in one
+        # transaction. Each claim is a single conditional UPDATE whose row
+        # lock lasts until commit, so the claims come last, right before the
+        # INSERT, and the slots commit or roll back together with the record.
+        if not claim_participant(campaign.pk):
+            return Response({'detail': 'This campaign has reached its participant limit.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        record = VaccineRecord(
+            patient=request.user,
+            campaign=campaign,
+            first_dose_schedule=first_schedule,
+            status=VaccineRecord.SCHEDULED
+        )
+        try:
+            with transaction.atomic():
+                second_doses = plan_second_doses([record], first_doses_claimed=False)
+                claimed = claim_slot(first_schedule.pk)
+                if claimed:
+                    claim_second_doses(second_doses)
+                    record.save()
+                    rollups.bookings_made([record])
+        except Exception as e:
+            release_participant(campaign.pk)
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not claimed:
+            release_participant(campaign.pk)
+            return Response({'detail': 'No available slots.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        out_serializer = VaccineRecordSerializer(record, context={'request': request})
+        return Response(out_serializer.data, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        method='post',
+        operation_summary="Join a Schedule Waitlist",
+        operation_description="Wait for a slot on a full schedule (Patient only, free campaigns). "
+                              "The oldest entry is booked automatically when a booking is cancelled.",
+        request_body=WaitlistJoinSerializer,
+        responses={201: WaitlistEntrySerializer()}
+    )
+    @swagger_auto_schema(
+        method='get',
+        operation_summary="My Waitlist Entries",
+        operation_description="The patient's waitlist entries in this campaign, with their positions",
+        responses={200: WaitlistEntrySerializer(many=True)}
+    )
+    @swagger_auto_schema(
+        method='delete',
+        operation_summary="Leave the Waitlist",
+        operation_description="Remove the patient's waitlist entries in this campaign",
+        responses={204: 'No Content'}
+    )
+    @action(detail=True, methods=['get', 'post', 'delete'], url_path='waitlist',
+            permission_classes=[IsAuthenticated, IsPatient], serializer_class=WaitlistJoinSerializer)
+    def waitlist(self, request, pk=None):
+        campaign = self.get_object()
+        entries = WaitlistEntry.objects.filter(patient=request.user, schedule__campaign=campaign)
+
+        if request.method == 'GET':
+            serializer = WaitlistEntrySerializer(entries.select_related('schedule'), many=True)
+            return Response(serializer.data)
+
+        if request.method == 'DELETE':
+            entries.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        serializer = WaitlistJoinSerializer(
             data=request.data,
             context={'request': request, 'campaign': campaign}
         )
         serializer.is_valid(raise_exception=True)
-        first_schedule = serializer.validated_data['first_dose_schedule']
+        entry, _ = WaitlistEntry.objects.get_or_create(
+            patient=request.user,
+            schedule=serializer.validated_data['first_dose_schedule']
+        )
+        return Response(WaitlistEntrySerializer(entry).data, status=status.HTTP_201_CREATED)
 
-        try:
-            with transaction.atomic():
-                locked_schedule = VaccineSchedule.objects.select_for_update().get(pk=first_schedule.pk)
-
-                if locked_schedule.available_slots <= 0:
-                    return Response({'detail': 'No available slots.'}, status=status.HTTP_400_BAD_REQUEST)
-
-                # Non-premium → create booking immediately
-                if not campaign.is_premium:
-                    record = VaccineRecord.objects.create(
-                        patient=request.user,
-                        campaign=campaign,
-                        first_dose_schedule=locked_schedule,
-                        status=VaccineRecord.SCHEDULED
-                    )
-                    locked_schedule.available_slots = F('available_slots') - 1
-                    locked_schedule.save()
-                    out_serializer = VaccineRecordSerializer(record, context={'request': request})
-                    return Response(out_serializer.data, status=status.HTTP_201_CREATED)
-
-                # Premium → create Payment first (no booking yet)
-                payment = Payment.objects.create(
-                    patient=request.user,
-                    record=None,
-                    amount=campaign.premium_price or 0,
-                    payment_status=Payment.PENDING,
-                    campaign_id=campaign.id,
-                    schedule_id=locked_schedule.id
-                )
+    @swagger_auto_schema(
+        operation_summary="Campaign Analytics",
+        operation_description="Fill rate, bookings, cancellations, dose completion and premium revenue of "
+                              "the doctor's campaigns, with a daily series from date_from to date_to "
+                              "(default: the last 30 days). Read from daily rollups.",
+        query_serializer=AnalyticsQuerySerializer,
+        responses={200: 'Campaign totals and daily series'}
+    )
+    @action(detail=False, methods=['get'], url_path='analytics')
+    def analytics(self, request):
+        params = AnalyticsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
 
-                return Response({
-                    "message": "Payment required",
-                    "payment_id": payment.id,
-                    "amount": payment.amount,
-                    "campaign_id": campaign.id,
-                    "schedule_id": locked_schedule.id
-                }, status=status.HTTP_200_OK)
+        campaigns = VaccineCampaign.objects.filter(created_by=request.user)
+        if 'campaign' in query:
+            campaigns = campaigns.filter(pk=query['campaign'])
+        return Response(rollups.dashboard(campaigns, query['date_from'], query['date_to']))
 
-        except VaccineSchedule.DoesNotExist:
-            return Response({'detail': 'Schedule not found.'}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
+    @swagger_auto_schema(
+        operation_summary="Nearby Vaccine Campaigns",
+        operation_description="Campaigns nearest to a point, optionally limited to radius_km. "
+                              "Without a radius the search widens until `limit` campaigns are found.",
+        query_serializer=NearbyQuerySerializer,
+        responses={200: NearbyCampaignSerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'], url_path='nearby')
+    def nearby(self, request):
+        params = NearbyQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        hits = geo.nearest(
+            self.get_conditional_queryset(),
+            query['lat'],
+            query['lng'],
+            query['limit'],
+            radius_km=query.get('radius_km')
+        )
+        distances = {pk: distance for distance, pk in hits}
+        campaigns = sorted(
+            self.get_queryset().filter(pk__in=distances),
+            key=lambda campaign: distances[campaign.pk]
+        )
+        serializer = NearbyCampaignSerializer(
+            campaigns, many=True, context={'request': request, 'distances': distances}
+        )
+        return Response(serializer.data)
+
+    @swagger_auto_schema(
+        operation_summary="Generate Vaccine Schedules",
+        operation_description="Generate recurring schedules for a campaign in one request (Doctor only). "
+                              "Set dry_run to preview the schedules without saving them.",
+        request_body=ScheduleGenerationSerializer,
+        responses={201: '{"created": 120, "skipped": 0}', 200: '{"dry_run": true, "count": 120, "skipped": 0, "schedules": [...]}'}
+    )
+    @action(detail=True, methods=['post'], url_path='generate-schedules', serializer_class=ScheduleGenerationSerializer)
+    def generate_schedules(self, request, pk=None):
+        campaign = self.get_object()
+        serializer = ScheduleGenerationSerializer(
+            data=request.data,
+            context={'request': request, 'campaign': campaign}
+        )
+        serializer.is_valid(raise_exception=True)
+        schedules, skipped = serializer.build_schedules()
+        data = serializer.validated_data
+
+        if data['dry_run']:
+            preview = VaccineScheduleSerializer(schedules, many=True, context={'campaign': campaign})
+            return Response({
+                "dry_run": True,
+                "start_date": data['start_date'],
+                "end_date": data['end_date'],
+                "count": len(schedules),
+                "skipped": skipped,
+                "schedules": preview.data
+            }, status=status.HTTP_200_OK)
+
+        with transaction.atomic():
+            created = VaccineSchedule.objects.bulk_create(schedules, batch_size=1000)
+        availability.invalidate_campaign(campaign.id)
+
+        return Response({
+            "start_date": data['start_date'],
+            "end_date": data['end_date'],
+            "created": len(created),
+            "skipped": skipped
+        }, status=status.HTTP_201_CREATED)
+
+    @swagger_auto_schema(
+        operation_summary="Import Bookings in Bulk",
+        operation_description="Book a batch of patients (by NID or email) from a CSV / JSONL file or a JSON list "
+                              "of rows (Doctor only). Returns a result per row. Set dry_run to validate only.",
+        request_body=BulkBookingSerializer,
+        responses={201: '{"dry_run": false, "booked": 980, "failed": 20, "results": [...]}', 400: 'Bad Request'}
+    )
+    @action(detail=True, methods=['post'], url_path='bookings/import', serializer_class=BulkBookingSerializer,
+            parser_classes=[JSONParser, MultiPartParser, FormParser])
+    def import_bookings(self, request, pk=None):
+        campaign = self.get_object()
+        serializer = BulkBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        try:
+            report = book_in_bulk(campaign.id, data['rows'], dry_run=data['dry_run'])
+        except BulkBookingError as e:
             return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-class VaccineScheduleViewSet(ModelViewSet):
+        return Response(report, status=status.HTTP_200_OK if data['dry_run'] else status.HTTP_201_CREATED)
+
+class VaccineScheduleViewSet(ConditionalGetMixin, ModelViewSet):
     queryset = VaccineSchedule.objects.select_related('campaign', 'campaign__created_by')
     serializer_class = VaccineScheduleSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend, SearchFilter]
     filterset_fields = ['date', 'campaign']
     pagination_class = DefaultPagination
+    keyset_ordering = ('date', 'start_time', 'id')
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -212,17 +453,54 @@ class VaccineScheduleViewSet(ModelViewSet):
     def perform_create(self, serializer):
         if self.request.user.role != User.Role.DOCTOR:
             raise PermissionDenied("Only doctors can create schedules")
-        serializer.save()
+        schedule = serializer.save()
+        availability.invalidate_campaign(schedule.campaign_id)
 
     def perform_update(self, serializer):
         if self.request.user.role != User.Role.DOCTOR:
             raise PermissionDenied("Only doctors can update schedules")
-        serializer.save()
+        previous_campaign_id = serializer.instance.campaign_id
+        schedule = serializer.save()
+        availability.invalidate_campaign(previous_campaign_id, [schedule.pk])
+        availability.invalidate_campaign(schedule.campaign_id, [schedule.pk])
 
     def perform_destroy(self, instance):
         if self.request.user.role != User.Role.DOCTOR:
             raise PermissionDenied("Only doctors can delete schedules")
+        schedule_id = instance.pk
         instance.delete()
+        availability.invalidate_campaign(instance.campaign_id, [schedule_id])
+
+    @swagger_auto_schema(
+        operation_summary="Cancel Bookings on a Schedule",
+        operation_description="Cancel the given first-dose bookings on this schedule, or all of them when "
+                              "record_ids is omitted (Doctor only). Freed slots go to the schedule's waitlist first.",
+        request_body=ScheduleCancellationSerializer,
+        responses={200: '{"cancelled": 30, "promoted": 12, "released": 18}'}
+    )
+    @action(detail=True, methods=['post'], url_path='cancel-bookings', serializer_class=ScheduleCancellationSerializer)
+    def cancel_schedule_bookings(self, request, *args, **kwargs):
+        if request.user.role != User.Role.DOCTOR:
+            raise PermissionDenied("Only doctors can cancel bookings on a schedule")
+        schedule = self.get_object()
+        if schedule.campaign.created_by_id != request.user.id:
+            raise PermissionDenied("You can only cancel bookings on your own campaigns")
+
+        serializer = ScheduleCancellationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        records = VaccineRecord.objects.filter(first_dose_schedule=schedule).only(
+            'id', 'second_dose_schedule_id', 'status'
+        )
+        if 'record_ids' in serializer.validated_data:
+            records = records.filter(pk__in=serializer.validated_data['record_ids'])
+        records = list(records)
+
+        promoted = cancel_bookings(schedule, records)
+        return Response({
+            "cancelled": len(records),
+            "promoted": len(promoted),
+            "released": len(records) - len(promoted)
+        }, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_summary="List Vaccine Schedules",
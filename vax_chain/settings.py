@@ -2,6 +2,7 @@ from pathlib import Path
 from datetime import timedelta
 from decouple import config
 import cloudinary
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -77,6 +78,7 @@ CORS_ALLOWED_ORIGINS = [
     'http://localhost:5173',
     'https://vaxchain-client.vercel.app'
 ]
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 INTERNAL_IPS = [
     # ...
     "127.0.0.1",
@@ -151,6 +153,43 @@ cloudinary.config(
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caches
+# The availability cache backs GET /campaigns/{id}/booking/. Local memory works
+# for a single process; point it at a shared backend (e.g.
+# django.core.cache.backends.redis.RedisCache) when running several workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'availability': {
+        'BACKEND': config('AVAILABILITY_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('AVAILABILITY_CACHE_LOCATION', default='availability'),
+        'TIMEOUT': config('AVAILABILITY_CACHE_TIMEOUT', default=300, cast=int),
+    },
+}
+AVAILABILITY_CACHE = 'availability'
+
+# Responses to POSTs sent with an Idempotency-Key header are replayed to
+# retries for this many seconds; purge_idempotency_keys deletes older ones.
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+
+# Seconds a premium booking holds its slot while the payment is pending;
+# release_expired_holds gives back the slots of holds that ran out.
+PAYMENT_HOLD_TTL = config('PAYMENT_HOLD_TTL', default=900, cast=int)
+
+# SSLCommerz client (bookings/gateway.py). PAYMENT_GATEWAY_URL points the
+# client at another host, e.g. the fake_payment_gateway command; leave it empty
+# for the real sandbox. Timeouts are in seconds; idempotent failures (connect
+# errors, 502/503/504) are retried with exponential backoff.
+PAYMENT_GATEWAY_URL = config('PAYMENT_GATEWAY_URL', default='')
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = config('PAYMENT_GATEWAY_CONNECT_TIMEOUT', default=3.05, cast=float)
+PAYMENT_GATEWAY_READ_TIMEOUT = config('PAYMENT_GATEWAY_READ_TIMEOUT', default=15, cast=float)
+PAYMENT_GATEWAY_RETRIES = config('PAYMENT_GATEWAY_RETRIES', default=2, cast=int)
+PAYMENT_GATEWAY_POOL_SIZE = config('PAYMENT_GATEWAY_POOL_SIZE', default=10, cast=int)
+
+# Dose reminder emails sent per second by send_dose_reminders (0 = no limit)
+REMINDER_RATE_LIMIT = config('REMINDER_RATE_LIMIT', default=0, cast=float)
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',